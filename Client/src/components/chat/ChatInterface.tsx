@@ -55,8 +55,14 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ className = '' }) => {
     setIsLoading(true);
 
     try {
-      // Call API
-      const response = await chatApi.sendMessage(userMessage.content);
+      // Call API, showing tokens as soon as they are streamed
+      const response = await chatApi.streamMessage(userMessage.content, (content) => {
+        setMessages(prev =>
+          prev.map(msg =>
+            msg.id === loadingMessage.id ? { ...msg, content, isLoading: false } : msg
+          )
+        );
+      });
       
       if (response.success && response.data) {
         const assistantMessage: Message = {
@@ -68,7 +74,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ className = '' }) => {
 
         // Replace loading message with actual response
         setMessages(prev => 
-          prev.filter(msg => !msg.isLoading).concat([assistantMessage])
+          prev.filter(msg => msg.id !== loadingMessage.id).concat([assistantMessage])
         );
       } else {
         // Handle error
@@ -80,7 +86,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ className = '' }) => {
         };
 
         setMessages(prev => 
-          prev.filter(msg => !msg.isLoading).concat([errorMessage])
+          prev.filter(msg => msg.id !== loadingMessage.id).concat([errorMessage])
         );
       }
     } catch (error) {
@@ -94,7 +100,7 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ className = '' }) => {
       };
 
       setMessages(prev => 
-        prev.filter(msg => !msg.isLoading).concat([errorMessage])
+        prev.filter(msg => msg.id !== loadingMessage.id).concat([errorMessage])
       );
     } finally {
       setIsLoading(false);
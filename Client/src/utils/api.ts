@@ -44,6 +44,72 @@ export const chatApi = {
       };
     }
   },
+
+  async streamMessage(
+    message: string,
+    onToken: (content: string) => void
+  ): Promise<ApiResponse<ChatResponse>> {
+    try {
+      // axios can't consume a response body incrementally in the browser, so use fetch
+      const token = localStorage.getItem('access_token');
+      const response = await fetch(`${API_BASE_URL}/chat/message/stream`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Accept: 'text/event-stream',
+          ...(token ? { Authorization: `Bearer ${token}` } : {}),
+        },
+        body: JSON.stringify({ message }),
+      });
+
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status code ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let content = '';
+      let timestamp = new Date().toISOString();
+
+      // Parse Server-Sent Events frames as they arrive
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary = buffer.indexOf('\n\n');
+        while (boundary !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          boundary = buffer.indexOf('\n\n');
+
+          const event = /^event: (.*)$/m.exec(frame)?.[1];
+          const data = JSON.parse(/^data: (.*)$/m.exec(frame)?.[1] ?? '{}');
+
+          if (event === 'token') {
+            content += data.token;
+            onToken(content);
+          } else if (event === 'done') {
+            timestamp = data.timestamp ?? timestamp;
+          } else if (event === 'error') {
+            throw new Error(data.error);
+          }
+        }
+      }
+
+      return {
+        success: true,
+        data: { message: content.trim(), timestamp },
+      };
+    } catch (error) {
+      console.error('Chat stream error:', error);
+      return {
+        success: false,
+        error: error instanceof Error ? error.message : 'Failed to send message',
+      };
+    }
+  },
 };
 
 export const uploadApi = {
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from config import settings
+from models import RetrievedChunk
+
+# (content hash, normalized question, config version)
+AnswerKey = Tuple[str, str, str]
+
+# Rough per-entry bookkeeping cost on top of the stored strings
+ENTRY_OVERHEAD_BYTES = 400
+SOURCE_OVERHEAD_BYTES = 150
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, Unicode forms and whitespace, and drop trailing punctuation"""
+    normalized = " ".join(unicodedata.normalize("NFKC", question).casefold().split())
+    return normalized.rstrip("?!. ")
+
+
+def config_version() -> str:
+    """Fingerprint of every setting that changes an answer, so other configurations never match"""
+    # Imported here so the model backend stays off the startup path
+    from llm import SYSTEM_PROMPT
+
+    fingerprint = json.dumps([
+        settings.ANSWER_CACHE_VERSION,
+        settings.RETRIEVAL_MODE,
+        settings.CHUNK_SIZE,
+        settings.CHUNK_OVERLAP,
+        settings.RETRIEVAL_TOP_K,
+        settings.EMBEDDING_DIM,
+        settings.LLM_BACKEND,
+        settings.LLM_BASE_URL,
+        settings.LLM_MODEL,
+        settings.LLM_MAX_TOKENS,
+        settings.LLM_TEMPERATURE,
+        SYSTEM_PROMPT,
+    ])
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+class AnswerCache:
+    """LRU of chat answers with a TTL, capped in bytes
+
+    Keys are (document content hash, normalized question, config version), so
+    the same question about the same bytes is answered once per TTL no matter
+    which user or file_id asks it. Backends never put the file's name or the
+    asker into a reply, so a shared answer reveals nothing about another
+    upload; routes add the file's display name per request. Entries are also
+    indexed by content hash so deleting or re-indexing a document drops all
+    of its answers at once.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float, version: Callable[[], str]):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._version_factory = version
+        self._version: Optional[str] = None
+        # key -> (reply, sources, expires_at, size)
+        self._entries: "OrderedDict[AnswerKey, Tuple[str, List[RetrievedChunk], float, int]]" = OrderedDict()
+        self._by_document: Dict[str, Set[AnswerKey]] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def version(self) -> str:
+        """Config version, computed on first use"""
+        if self._version is None:
+            self._version = self._version_factory()
+        return self._version
+
+    def _key(self, content_hash: str, question: str) -> AnswerKey:
+        return content_hash, normalize_question(question), self.version
+
+    def _remove(self, key: AnswerKey) -> None:
+        """Drop an entry from both indexes (lock held)"""
+        _, _, _, size = self._entries.pop(key)
+        self._size -= size
+        keys = self._by_document.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_document[key[0]]
+
+    def get(self, content_hash: str, question: str) -> Optional[Tuple[str, List[RetrievedChunk]]]:
+        """Get the cached (reply, sources) for a question about a document"""
+        if self.max_bytes <= 0:
+            return None
+        key = self._key(content_hash, question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            reply, sources, expires_at, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return reply, sources
+
+    def put(self, content_hash: str, question: str, reply: str, sources: List[RetrievedChunk]) -> None:
+        """Cache an answer, evicting least recently used answers to stay under the byte cap"""
+        size = (
+            ENTRY_OVERHEAD_BYTES + len(reply.encode("utf-8")) + len(question.encode("utf-8"))
+            + sum(SOURCE_OVERHEAD_BYTES + len(source.text.encode("utf-8")) for source in sources)
+        )
+        if size > self.max_bytes:
+            return
+
+        key = self._key(content_hash, question)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (reply, sources, time.time() + self.ttl_seconds, size)
+            self._by_document.setdefault(content_hash, set()).add(key)
+            self._size += size
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, content_hash: str) -> int:
+        """Drop every answer about a document, returning how many were dropped"""
+        with self._lock:
+            keys = list(self._by_document.get(content_hash, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_document.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Get size and hit/miss/eviction counters for capacity planning"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
+
+
+answer_cache = AnswerCache(settings.ANSWER_CACHE_MAX_BYTES, settings.ANSWER_CACHE_TTL_SECONDS, config_version)
@@ -1,83 +1,148 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Optional, Dict, Any, Callable, TypeVar
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import uuid
 
 from config import settings
-from models import UserInDB, TokenData
+from models import UserInDB, TokenData, UserRole
+from token_cache import token_cache
+from revocation import revocation_store
+from user_store import UserExistsError, user_store
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """Get the password hashing context, loading passlib on first use"""
+    # Imported here so startup does not pay for passlib and its bcrypt backend
+    from passlib.context import CryptContext
+    
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+# bcrypt takes ~200ms per call and releases the GIL, so it runs on its own
+# thread pool; the semaphore bounds how many calls are handed to the pool
+password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+password_semaphore = asyncio.Semaphore(settings.PASSWORD_HASH_CONCURRENCY)
+password_tasks_waiting = 0
+password_tasks_running = 0
+
+T = TypeVar("T")
 
 # Token security
 security = HTTPBearer()
 
-# Dummy in-memory user database
-# TODO: Replace with actual database implementation
-users_db: Dict[str, UserInDB] = {}
-
 # Dummy users for testing
 def init_dummy_users():
-    """Initialize some dummy users for testing"""
+    """Initialize some dummy users for testing (every worker runs this; existing users are kept)"""
     dummy_users = [
         {
             "username": "testuser",
             "email": "test@example.com",
-            "password": "testpass123",
-            "full_name": "Test User"
+            # bcrypt hash of "testpass123", precomputed so startup does no hashing
+            "hashed_password": "$2b$12$/8ZUpHVslAQlOxvfpxBrSeYVqNelKttP2BHrNpBMrESd1gFGQxWy6",
+            "full_name": "Test User",
+            "role": UserRole.USER
         },
         {
             "username": "admin",
             "email": "admin@example.com", 
-            "password": "admin123",
-            "full_name": "Admin User"
+            # bcrypt hash of "admin123"
+            "hashed_password": "$2b$12$jQczBmIoWYe6f650P7sAB.mZqjj1OtaShdU.tCIQkfGUW6J0sOGYK",
+            "full_name": "Admin User",
+            "role": UserRole.ADMIN
         }
     ]
     
-    for user_data in dummy_users:
-        user_id = str(uuid.uuid4())
-        hashed_password = get_password_hash(user_data["password"])
-        
-        user = UserInDB(
-            id=user_id,
+    # Stable IDs so persisted uploads still belong to the dummy users after a restart
+    user_store.add_missing([
+        UserInDB(
+            id=str(uuid.uuid5(uuid.NAMESPACE_URL, f"pdf-chat-dummy-user:{user_data['username']}")),
             username=user_data["username"],
             email=user_data["email"],
             full_name=user_data["full_name"],
-            hashed_password=hashed_password,
+            hashed_password=user_data["hashed_password"],
+            role=user_data["role"],
             created_at=datetime.utcnow(),
             is_active=True
         )
-        users_db[user.username] = user
+        for user_data in dummy_users
+    ])
 
 # Password utilities
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a plain password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
     """Generate password hash"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+
+async def run_password_task(func: Callable[..., T], *args: Any) -> T:
+    """Run a password hashing function on the password pool"""
+    global password_tasks_waiting, password_tasks_running
+    password_tasks_waiting += 1
+    try:
+        await password_semaphore.acquire()
+    finally:
+        password_tasks_waiting -= 1
+    
+    password_tasks_running += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, func, *args)
+    finally:
+        password_tasks_running -= 1
+        password_semaphore.release()
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password without blocking the event loop"""
+    return await run_password_task(verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate a password hash without blocking the event loop"""
+    return await run_password_task(get_password_hash, password)
+
+
+def revoke_token(token_data: TokenData) -> None:
+    """Revoke a verified token until it expires"""
+    if token_data.jti and token_data.exp:
+        revocation_store.revoke(token_data.jti, token_data.exp)
+
+
+def get_password_pool_stats() -> Dict[str, int]:
+    """Get password pool size and queue depth"""
+    return {
+        "workers": settings.PASSWORD_HASH_WORKERS,
+        "concurrency_limit": settings.PASSWORD_HASH_CONCURRENCY,
+        "running": password_tasks_running,
+        "waiting": password_tasks_waiting,
+        "queue_depth": password_tasks_running + password_tasks_waiting,
+    }
 
 
 # User utilities
 def get_user_by_username(username: str) -> Optional[UserInDB]:
     """Get user by username from database"""
-    return users_db.get(username)
+    return user_store.get_by_username(username)
 
 
 def get_user_by_email(email: str) -> Optional[UserInDB]:
     """Get user by email from database"""
-    for user in users_db.values():
-        if user.email == email:
-            return user
-    return None
+    return user_store.get_by_email(email)
 
 
-def create_user(username: str, email: str, password: str, full_name: Optional[str] = None) -> UserInDB:
+async def create_user(username: str, email: str, password: str, full_name: Optional[str] = None) -> UserInDB:
     """Create a new user"""
     # Check if user already exists
     if get_user_by_username(username):
@@ -94,7 +159,7 @@ def create_user(username: str, email: str, password: str, full_name: Optional[st
     
     # Create new user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(password)
+    hashed_password = await get_password_hash_async(password)
     
     user = UserInDB(
         id=user_id,
@@ -106,17 +171,23 @@ def create_user(username: str, email: str, password: str, full_name: Optional[st
         is_active=True
     )
     
-    # Store in database
-    users_db[username] = user
+    # Store in database; another registration (possibly on another worker) may have won the race while hashing
+    try:
+        user_store.add(user)
+    except UserExistsError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Username or email already registered"
+        )
     return user
 
 
-def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
+async def authenticate_user(username: str, password: str) -> Optional[UserInDB]:
     """Authenticate user credentials"""
     user = get_user_by_username(username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return None
     return user
 
@@ -130,7 +201,8 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
@@ -143,18 +215,38 @@ def create_refresh_token(data: Dict[str, Any], expires_delta: Optional[timedelta
     else:
         expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     
-    to_encode.update({"exp": expire, "type": "refresh"})
+    to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
+    from jose import jwt
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 
-def verify_token(token: str, token_type: str = "access") -> TokenData:
-    """Verify and decode JWT token"""
-    credentials_exception = HTTPException(
+def credentials_exception() -> HTTPException:
+    """Build the 401 raised for any invalid token"""
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def verify_token(token: str, token_type: str = "access") -> TokenData:
+    """Verify and decode JWT token"""
+    # Clients poll with the same token, so skip the HMAC check and model construction on repeats
+    token_data = token_cache.get(token, token_type)
+    if token_data is None:
+        token_data = decode_token(token, token_type)
+    
+    # Checked on every call, cached or not, so logout takes effect immediately
+    if token_data.jti and revocation_store.is_revoked(token_data.jti):
+        raise credentials_exception()
+    
+    return token_data
+
+
+def decode_token(token: str, token_type: str) -> TokenData:
+    """Fully decode and validate a JWT, caching the claims until it expires"""
+    from jose import JWTError, jwt
     
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
@@ -163,16 +255,23 @@ def verify_token(token: str, token_type: str = "access") -> TokenData:
         token_type_in_token: str = payload.get("type")
         
         if username is None or user_id is None:
-            raise credentials_exception
+            raise credentials_exception()
         
         if token_type_in_token != token_type:
-            raise credentials_exception
+            raise credentials_exception()
             
-        token_data = TokenData(username=username, user_id=user_id)
+        token_data = TokenData(
+            username=username,
+            user_id=user_id,
+            jti=payload.get("jti"),
+            exp=payload.get("exp")
+        )
+        if payload.get("exp") is not None:
+            token_cache.put(token, token_type, token_data, float(payload["exp"]))
         return token_data
         
     except JWTError:
-        raise credentials_exception
+        raise credentials_exception()
 
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> UserInDB:
@@ -202,3 +301,13 @@ async def get_current_active_user(current_user: UserInDB = Depends(get_current_u
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
+
+
+async def get_current_admin_user(current_user: UserInDB = Depends(get_current_active_user)) -> UserInDB:
+    """Get current user, requiring the admin role"""
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required"
+        )
+    return current_user
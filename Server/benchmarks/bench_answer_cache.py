@@ -0,0 +1,116 @@
+"""
+Benchmark: /chat/message latency with and without the answer cache
+
+Uploads a generated PDF to a scratch data directory, then asks QUESTIONS
+distinct questions about it twice: the first pass misses the cache (retrieval
+plus the model call), the second is served from the answer cache. Also
+times AnswerCache.get on its own.
+
+Chat goes through the offline echo backend unless LLM_BACKEND is set, so the
+miss path understates a real model's cost; combine with benchmarks.llm_stub
+for realistic misses.
+
+Usage (from the Server directory):
+    python -m benchmarks.bench_answer_cache [--questions 200] [--pages 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import List
+
+import httpx
+
+from benchmarks.loadtest import SERVER_DIR, WORDS, make_pdf, percentile, random_pages
+
+
+def summarize(name: str, samples: List[float]) -> None:
+    print(
+        f"{name:<22} n={len(samples):<5} "
+        f"p50={percentile(samples, 50):8.3f}ms  "
+        f"p95={percentile(samples, 95):8.3f}ms  "
+        f"mean={statistics.mean(samples):8.3f}ms"
+    )
+
+
+async def ask_all(client: httpx.AsyncClient, prefix: str, headers: dict, file_id: str, questions: List[str]) -> List[float]:
+    latencies = []
+    for question in questions:
+        started = time.perf_counter()
+        response = await client.post(
+            f"{prefix}/chat/message", json={"message": question, "file_id": file_id}, headers=headers
+        )
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+async def run(args: argparse.Namespace) -> None:
+    # Imported after switching to the scratch directory so every store opens there
+    from main import app
+    from config import settings
+    from answer_cache import answer_cache
+
+    rng = random.Random(1)
+    prefix = settings.API_V1_PREFIX
+    questions = [" ".join(rng.choice(WORDS) for _ in range(6)) + "?" for _ in range(args.questions)]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            response = await client.post(
+                f"{prefix}/auth/login", json={"username": "testuser", "password": "testpass123"}
+            )
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            document = make_pdf(random_pages(rng, args.pages))
+            response = await client.post(
+                f"{prefix}/uploads/pdf", files={"file": ("bench.pdf", document, "application/pdf")}, headers=headers
+            )
+            response.raise_for_status()
+            file_id = response.json()["file_id"]
+
+            # Build the indexes first so the miss pass measures retrieval, not ingestion
+            await ask_all(client, prefix, headers, file_id, ["warm up the index"])
+
+            misses = await ask_all(client, prefix, headers, file_id, questions)
+            hits = await ask_all(client, prefix, headers, file_id, questions)
+
+    content_hash = next(iter(answer_cache._by_document))
+    started = time.perf_counter()
+    for question in questions * 50:
+        answer_cache.get(content_hash, question)
+    get_us = (time.perf_counter() - started) / (len(questions) * 50) * 1_000_000
+
+    summarize("/chat/message miss", misses)
+    summarize("/chat/message hit", hits)
+    print(f"AnswerCache.get        {get_us:8.2f} us/call")
+    print(f"cache stats            {answer_cache.stats()}")
+
+
+def main(args: argparse.Namespace) -> None:
+    # Measure the cache, not the per-client rate limits
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    workdir = tempfile.mkdtemp(prefix="bench-answer-cache-")
+    sys.path.insert(0, SERVER_DIR)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        asyncio.run(run(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=200, help="distinct questions asked per pass")
+    parser.add_argument("--pages", type=int, default=20, help="pages in the generated PDF")
+    main(parser.parse_args())
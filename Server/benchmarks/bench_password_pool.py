@@ -0,0 +1,96 @@
+"""
+Benchmark: /health latency while a burst of logins hashes passwords
+
+Runs the app in-process through an ASGI transport, measures /health latency
+at rest, then again while LOGINS concurrent /auth/login requests are running.
+With bcrypt on the password pool the two p99s should be close; with bcrypt on
+the event loop every /health call would queue behind whole login batches.
+
+Usage (from the Server directory):
+    python -m benchmarks.bench_password_pool [--logins 100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import List
+
+import httpx
+
+# The burst comes from one client, so it would otherwise be cut off by the login rate limit
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+from main import app
+from config import settings
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name: str, samples: List[float]) -> None:
+    print(
+        f"{name:<24} n={len(samples):<5} "
+        f"p50={percentile(samples, 50):7.2f}ms  "
+        f"p99={percentile(samples, 99):7.2f}ms  "
+        f"max={max(samples):7.2f}ms  "
+        f"mean={statistics.mean(samples):7.2f}ms"
+    )
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, samples: List[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await client.get("/health")
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def login(client: httpx.AsyncClient) -> float:
+    started = time.perf_counter()
+    response = await client.post(
+        f"{settings.API_V1_PREFIX}/auth/login",
+        json={"username": "testuser", "password": "testpass123"}
+    )
+    response.raise_for_status()
+    return (time.perf_counter() - started) * 1000
+
+
+async def main(logins: int, idle_seconds: float) -> None:
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Baseline: /health with nothing else running
+            idle_samples: List[float] = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_health(client, stop, idle_samples))
+            await asyncio.sleep(idle_seconds)
+            stop.set()
+            await probe
+            
+            # Login storm with /health probed throughout
+            storm_samples: List[float] = []
+            stop = asyncio.Event()
+            probe = asyncio.create_task(probe_health(client, stop, storm_samples))
+            started = time.perf_counter()
+            login_latencies = await asyncio.gather(*(login(client) for _ in range(logins)))
+            storm_seconds = time.perf_counter() - started
+            stop.set()
+            await probe
+    
+    print(f"password pool: {settings.PASSWORD_HASH_WORKERS} workers, concurrency {settings.PASSWORD_HASH_CONCURRENCY}")
+    print(f"{logins} logins in {storm_seconds:.2f}s ({logins / storm_seconds:.1f} logins/s)")
+    summarize("/health (idle)", idle_samples)
+    summarize("/health (login storm)", storm_samples)
+    summarize("/auth/login", login_latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=100, help="concurrent logins to run")
+    parser.add_argument("--idle-seconds", type=float, default=1.0, help="how long to sample /health at rest")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.idle_seconds))
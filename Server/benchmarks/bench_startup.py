@@ -0,0 +1,91 @@
+"""
+Startup benchmark: import time, lifespan startup and background warm-up
+
+Starts the app in a fresh interpreter for every run (so nothing is already
+imported) and times each phase separately:
+
+- import:        `import main` (FastAPI, routers, models, stores)
+- lifespan:      running the lifespan startup until the app can serve
+- first request: GET /health right after startup
+- warm-up:       until the background warm-up task finishes (FAST_STARTUP only)
+
+Runs with FAST_STARTUP=true and FAST_STARTUP=false and prints the median of
+each phase.
+
+Usage (from the Server directory):
+    python -m benchmarks.bench_startup [--runs 5]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child interpreter and prints one JSON line of timings in milliseconds
+CHILD_SCRIPT = """
+import asyncio, json, time
+
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+import httpx
+
+async def run():
+    timings = {"import": (imported - started) * 1000}
+    phase = time.perf_counter()
+    async with main.app.router.lifespan_context(main.app):
+        timings["lifespan"] = (time.perf_counter() - phase) * 1000
+
+        phase = time.perf_counter()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            await client.get("/health")
+        timings["first_request"] = (time.perf_counter() - phase) * 1000
+
+        task = main.app.state.warmup_task
+        if task is not None:
+            phase = time.perf_counter()
+            await task
+            timings["warmup"] = (time.perf_counter() - phase) * 1000
+    print(json.dumps(timings))
+
+asyncio.run(run())
+"""
+
+PHASES = ["import", "lifespan", "first_request", "warmup"]
+
+
+def run_once(fast_startup: bool) -> dict:
+    """Start the app in a new interpreter and return its phase timings"""
+    env = dict(os.environ, FAST_STARTUP="true" if fast_startup else "false")
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    # The lifespan prints banners; the timings are on the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(runs: int) -> None:
+    for fast_startup in (True, False):
+        samples = [run_once(fast_startup) for _ in range(runs)]
+        print(f"FAST_STARTUP={'true' if fast_startup else 'false'} (median of {runs} runs)")
+        for phase in PHASES:
+            values = [sample[phase] for sample in samples if phase in sample]
+            if values:
+                print(f"  {phase:14s} {statistics.median(values):8.1f} ms")
+        ready = [sample["import"] + sample["lifespan"] for sample in samples]
+        print(f"  {'ready to serve':14s} {statistics.median(ready):8.1f} ms")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreter starts per profile")
+    args = parser.parse_args()
+    main(args.runs)
@@ -0,0 +1,187 @@
+"""
+Worker scaling benchmark: throughput of /auth/me and /uploads/pdfs under `uvicorn --workers N`
+
+For each worker count, starts a real uvicorn server on a fresh scratch
+directory, registers a user, uploads a few PDFs and then:
+
+- checks that every worker sees the same state: the new user can log in and
+  list its uploads over many fresh connections (which the OS spreads across
+  workers), so a per-process store would show up as 401s or missing files
+- drives /auth/me and /uploads/pdfs from several client processes for
+  DURATION seconds each and reports requests per second and p50/p95
+
+Scaling is reported relative to one worker; it can only be near-linear when
+the machine has at least as many free cores as server workers plus clients.
+
+Usage (from the Server directory):
+    python -m benchmarks.bench_workers [--workers 1,2,4] [--duration 5] [--clients 4]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.loadtest import SERVER_DIR, make_pdf, percentile
+
+ENDPOINTS = {
+    "auth_me": "/api/v1/auth/me",
+    "list_files": "/api/v1/uploads/pdfs?limit=20",
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int, workdir: str) -> subprocess.Popen:
+    """Start uvicorn with the given number of workers and wait until it answers"""
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--app-dir", SERVER_DIR,
+            "--host", "127.0.0.1",
+            "--port", str(port),
+            "--workers", str(workers),
+            "--log-level", "warning",
+            "--no-access-log",
+        ],
+        cwd=workdir,
+        # All load comes from one client IP and user, which the rate limits would throttle
+        env=dict(os.environ, RATE_LIMIT_ENABLED="false"),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Server with {workers} worker(s) did not start")
+
+
+def prepare(base_url: str, files: int) -> str:
+    """Register a user, upload some PDFs and return an access token"""
+    username = f"bench{os.getpid()}"
+    with httpx.Client(base_url=base_url, timeout=30) as client:
+        client.post("/api/v1/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": "benchpass123"
+        }).raise_for_status()
+        response = client.post("/api/v1/auth/login", json={"username": username, "password": "benchpass123"})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for index in range(files):
+            document = make_pdf([f"worker scaling benchmark document {index} page {page}" for page in range(3)])
+            client.post(
+                "/api/v1/uploads/pdf",
+                files={"file": (f"bench-{index}.pdf", document, "application/pdf")},
+                headers=headers
+            ).raise_for_status()
+    return token
+
+
+def check_consistency(base_url: str, token: str, files: int, connections: int) -> int:
+    """Hit the server over fresh connections and count responses that disagree with the shared state"""
+    failures = 0
+    headers = {"Authorization": f"Bearer {token}"}
+    for _ in range(connections):
+        # A new client per request so the kernel can hand each connection to a different worker
+        with httpx.Client(base_url=base_url, timeout=30) as client:
+            me = client.get(ENDPOINTS["auth_me"], headers=headers)
+            listing = client.get(ENDPOINTS["list_files"], headers=headers)
+        if me.status_code != 200 or listing.status_code != 200 or listing.json()["total_count"] != files:
+            failures += 1
+    return failures
+
+
+async def drive(base_url: str, path: str, token: str, concurrency: int, duration: float) -> List[float]:
+    latencies: List[float] = []
+    headers = {"Authorization": f"Bearer {token}"}
+    deadline = time.perf_counter() + duration
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, headers=headers) as client:
+        async def loop() -> None:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.get(path)
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return latencies
+
+
+def client_process(job: Tuple[str, str, str, int, float]) -> List[float]:
+    """One load-generating process (top level so multiprocessing can pickle it)"""
+    return asyncio.run(drive(*job))
+
+
+def measure(base_url: str, path: str, token: str, clients: int, concurrency: int, duration: float) -> Dict[str, float]:
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.map(client_process, [(base_url, path, token, concurrency, duration)] * clients)
+    latencies = [latency for result in results for latency in result]
+    return {
+        "rps": len(latencies) / duration,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def main(args: argparse.Namespace) -> int:
+    worker_counts = [int(count) for count in args.workers.split(",")]
+    baseline: Dict[str, float] = {}
+    inconsistent = 0
+    print(f"{os.cpu_count()} CPU(s); {args.clients} client process(es) x {args.concurrency} connections")
+    print(f"{'workers':>7s} {'endpoint':12s} {'req/s':>9s} {'scaling':>8s} {'p50 ms':>8s} {'p95 ms':>8s}")
+
+    for workers in worker_counts:
+        workdir = tempfile.mkdtemp(prefix="bench-workers-")
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        server = start_server(workers, port, workdir)
+        try:
+            token = prepare(base_url, args.files)
+            failures = check_consistency(base_url, token, args.files, args.consistency_checks)
+            inconsistent += failures
+
+            for name, path in ENDPOINTS.items():
+                result = measure(base_url, path, token, args.clients, args.concurrency, args.duration)
+                baseline.setdefault(name, result["rps"])
+                print(
+                    f"{workers:7d} {name:12s} {result['rps']:9.1f} {result['rps'] / baseline[name]:7.2f}x "
+                    f"{result['p50_ms']:8.2f} {result['p95_ms']:8.2f}"
+                )
+            if failures:
+                print(f"        {failures}/{args.consistency_checks} fresh connections saw inconsistent state")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return 1 if inconsistent else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated uvicorn worker counts")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of load per endpoint")
+    parser.add_argument("--clients", type=int, default=4, help="load-generating processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--files", type=int, default=5, help="PDFs uploaded before measuring")
+    parser.add_argument("--consistency-checks", type=int, default=40, help="fresh connections checked per run")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,145 @@
+"""
+Local OpenAI-compatible stub server for offline chat load tests
+
+Implements `POST /v1/chat/completions` (streaming and non-streaming) and
+`GET /v1/models`. Replies are generated from the question without a model,
+with injectable latency so the full chat path can be load-tested offline:
+
+- --first-token-ms: delay before the first token (prompt processing)
+- --token-ms:       delay between tokens (decoding speed)
+- --jitter:         each delay is scaled by a random factor in [1 - j, 1 + j]
+- --tokens:         reply length in tokens (capped by the request's max_tokens)
+- --error-rate:     fraction of requests answered with a 500
+
+Point the API at it with:
+    LLM_BACKEND=openai LLM_BASE_URL=http://127.0.0.1:8001/v1
+
+Usage (from the Server directory):
+    python -m benchmarks.llm_stub [--port 8001] [--first-token-ms 200] [--token-ms 20]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import AsyncIterator, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+app = FastAPI(title="LLM stub")
+
+# Replaced from the command line in main()
+stub_config = {
+    "first_token_ms": 200.0,
+    "token_ms": 20.0,
+    "jitter": 0.2,
+    "tokens": 60,
+    "error_rate": 0.0,
+}
+
+FILLER = "Based on the passages provided the answer is summarized here with the relevant page numbers cited".split()
+
+
+def delay(ms: float) -> float:
+    """Jittered delay in seconds"""
+    jitter = stub_config["jitter"]
+    return max(0.0, ms * random.uniform(1 - jitter, 1 + jitter)) / 1000
+
+
+def reply_tokens(body: dict) -> List[str]:
+    """Build a deterministic reply from the last user message"""
+    question = next(
+        (message.get("content", "") for message in reversed(body.get("messages", [])) if message.get("role") == "user"),
+        ""
+    )
+    # The question is the last line of prompts built by the API's backends
+    last_line = question.strip().splitlines()[-1] if question.strip() else ""
+    words = ["Stub", "reply", "to:"] + last_line.split()[:20]
+    count = min(stub_config["tokens"], int(body.get("max_tokens") or stub_config["tokens"]))
+    words = (words + FILLER * (count // len(FILLER) + 1))[:count]
+    return [word + " " for word in words]
+
+
+def chunk(completion_id: str, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.get("/v1/models")
+async def list_models():
+    return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if random.random() < stub_config["error_rate"]:
+        return JSONResponse(
+            status_code=500,
+            content={"error": {"message": "Injected failure", "type": "server_error"}}
+        )
+
+    tokens = reply_tokens(body)
+    model = body.get("model", "stub")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        await asyncio.sleep(delay(stub_config["first_token_ms"] + stub_config["token_ms"] * len(tokens)))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens).strip()},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)},
+        }
+
+    async def stream() -> AsyncIterator[str]:
+        await asyncio.sleep(delay(stub_config["first_token_ms"]))
+        yield chunk(completion_id, model, {"role": "assistant"})
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(delay(stub_config["token_ms"]))
+            yield chunk(completion_id, model, {"content": token})
+        yield chunk(completion_id, model, {}, "stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-ms", type=float, default=stub_config["first_token_ms"])
+    parser.add_argument("--token-ms", type=float, default=stub_config["token_ms"])
+    parser.add_argument("--jitter", type=float, default=stub_config["jitter"])
+    parser.add_argument("--tokens", type=int, default=stub_config["tokens"])
+    parser.add_argument("--error-rate", type=float, default=stub_config["error_rate"])
+    args = parser.parse_args()
+
+    stub_config.update(
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        jitter=args.jitter,
+        tokens=args.tokens,
+        error_rate=args.error_rate,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Load test: mixed API workloads run in-process through an ASGI transport
+
+Scenarios, run one after another against a fresh data directory:
+
+- login_storm: LOGINS concurrent /auth/login requests
+- uploads:     UPLOADS generated multi-page PDFs, CONCURRENCY at a time
+- mixed:       CONCURRENCY virtual users for DURATION seconds, each looping
+               over listing, file metadata, /auth/me and chat with retrieval
+               against the uploaded PDFs
+
+With --llm-stub, chat goes through the OpenAI-compatible backend against
+benchmarks/llm_stub.py started on a free port, with the given first-token
+and per-token latencies, instead of the offline echo backend.
+
+Prints throughput and p50/p95/p99 per endpoint and writes them as JSON.
+With --baseline, compares against an earlier results file and exits with
+status 1 if any endpoint's p95 or any scenario's throughput regressed by
+more than --tolerance.
+
+Usage (from the Server directory):
+    python -m benchmarks.loadtest --output results.json
+    python -m benchmarks.loadtest --baseline results.json [--tolerance 0.2]
+    python -m benchmarks.loadtest --llm-stub --llm-first-token-ms 300 --llm-token-ms 25
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "model data learning network training result method analysis system value "
+    "feature layer input output error function sample gradient theory research "
+    "table figure section experiment dataset baseline accuracy loss paper study"
+).split()
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """Build a minimal text PDF with one Helvetica text block per page"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(len(pages)))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>")
+    font_id = 3 + 2 * len(pages)
+    for i, text in enumerate(pages):
+        lines = [text[start:start + 80] for start in range(0, len(text), 80)][:60]
+        stream = "\n".join(
+            f"BT /F1 10 Tf 40 {750 - 12 * row} Td ({line}) Tj ET" for row, line in enumerate(lines)
+        )
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def random_pages(rng: random.Random, page_count: int) -> List[str]:
+    return [" ".join(rng.choice(WORDS) for _ in range(400)) for _ in range(page_count)]
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Recorder:
+    """Collects per-endpoint latencies and errors for one scenario"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    async def call(self, endpoint: str, request) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except Exception:
+            response = None
+        self.latencies.setdefault(endpoint, []).append((time.perf_counter() - started) * 1000)
+        if response is None or response.status_code >= 400:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+        return response
+
+    def finish(self) -> None:
+        self.finished = time.perf_counter()
+
+    def summary(self) -> dict:
+        duration = (self.finished or time.perf_counter()) - self.started
+        total = sum(len(samples) for samples in self.latencies.values())
+        return {
+            "duration_s": round(duration, 3),
+            "requests": total,
+            "throughput_rps": round(total / duration, 2) if duration else 0.0,
+            "endpoints": {
+                endpoint: {
+                    "count": len(samples),
+                    "errors": self.errors.get(endpoint, 0),
+                    "throughput_rps": round(len(samples) / duration, 2) if duration else 0.0,
+                    "p50_ms": round(percentile(samples, 50), 3),
+                    "p95_ms": round(percentile(samples, 95), 3),
+                    "p99_ms": round(percentile(samples, 99), 3),
+                    "mean_ms": round(statistics.mean(samples), 3),
+                    "max_ms": round(max(samples), 3),
+                }
+                for endpoint, samples in sorted(self.latencies.items())
+            },
+        }
+
+
+async def login_storm(client: httpx.AsyncClient, prefix: str, logins: int) -> dict:
+    recorder = Recorder()
+    await asyncio.gather(*(
+        recorder.call("POST /auth/login", client.post(
+            f"{prefix}/auth/login", json={"username": "testuser", "password": "testpass123"}
+        ))
+        for _ in range(logins)
+    ))
+    recorder.finish()
+    return recorder.summary()
+
+
+async def upload_burst(
+    client: httpx.AsyncClient, prefix: str, headers: dict, uploads: int, concurrency: int, pages: int, rng: random.Random
+) -> Tuple[dict, List[str]]:
+    # Generated up front so PDF building is not part of the measured time
+    documents = [make_pdf(random_pages(rng, pages)) for _ in range(uploads)]
+    semaphore = asyncio.Semaphore(concurrency)
+    file_ids: List[str] = []
+    recorder = Recorder()
+
+    async def upload(index: int, document: bytes) -> None:
+        async with semaphore:
+            response = await recorder.call("POST /uploads/pdf", client.post(
+                f"{prefix}/uploads/pdf",
+                files={"file": (f"loadtest-{index}.pdf", document, "application/pdf")},
+                headers=headers
+            ))
+        if response is not None and response.status_code == 201:
+            file_ids.append(response.json()["file_id"])
+
+    await asyncio.gather(*(upload(index, document) for index, document in enumerate(documents)))
+    recorder.finish()
+    return recorder.summary(), file_ids
+
+
+async def wait_for_ingestion(timeout: float = 600) -> None:
+    """Wait until the ingestion queue has no queued or running jobs"""
+    from ingestion_queue import QUEUED, PROCESSING, ingestion_queue
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        stats = ingestion_queue.stats()
+        if stats[QUEUED] == 0 and stats[PROCESSING] == 0:
+            return
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Ingestion did not finish in time")
+
+
+async def mixed_traffic(
+    client: httpx.AsyncClient, prefix: str, headers: dict, file_ids: List[str],
+    concurrency: int, duration: float, rng: random.Random
+) -> dict:
+    recorder = Recorder()
+    deadline = time.perf_counter() + duration
+
+    async def virtual_user(seed: int) -> None:
+        user_rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            roll = user_rng.random()
+            if roll < 0.3:
+                await recorder.call("GET /uploads/pdfs", client.get(
+                    f"{prefix}/uploads/pdfs", params={"limit": 20}, headers=headers
+                ))
+            elif roll < 0.45:
+                await recorder.call("GET /uploads/pdf/{file_id}", client.get(
+                    f"{prefix}/uploads/pdf/{user_rng.choice(file_ids)}", headers=headers
+                ))
+            elif roll < 0.6:
+                await recorder.call("GET /auth/me", client.get(f"{prefix}/auth/me", headers=headers))
+            else:
+                question = " ".join(user_rng.choice(WORDS) for _ in range(6))
+                await recorder.call("POST /chat/message", client.post(
+                    f"{prefix}/chat/message",
+                    json={"message": question, "file_id": user_rng.choice(file_ids)},
+                    headers=headers
+                ))
+
+    await asyncio.gather(*(virtual_user(rng.randrange(2 ** 32)) for _ in range(concurrency)))
+    recorder.finish()
+    return recorder.summary()
+
+
+async def run_scenarios(args: argparse.Namespace) -> dict:
+    # Imported after switching to the scratch directory so every store opens there
+    from main import app
+    from config import settings
+
+    rng = random.Random(args.seed)
+    prefix = settings.API_V1_PREFIX
+    scenarios = {}
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+            scenarios["login_storm"] = await login_storm(client, prefix, args.logins)
+
+            response = await client.post(
+                f"{prefix}/auth/login", json={"username": "testuser", "password": "testpass123"}
+            )
+            response.raise_for_status()
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+            scenarios["uploads"], file_ids = await upload_burst(
+                client, prefix, headers, args.uploads, args.concurrency, args.pages, rng
+            )
+            if not file_ids:
+                raise RuntimeError("No uploads succeeded; cannot run the mixed scenario")
+
+            # Let background ingestion settle so the mixed scenario measures steady state
+            await wait_for_ingestion()
+
+            scenarios["mixed"] = await mixed_traffic(
+                client, prefix, headers, file_ids, args.concurrency, args.duration, rng
+            )
+
+    return {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "cpu_count": os.cpu_count(),
+            "retrieval_mode": settings.RETRIEVAL_MODE,
+            "metadata_backend": settings.METADATA_BACKEND,
+            "llm_backend": settings.LLM_BACKEND,
+            "args": {
+                "logins": args.logins,
+                "uploads": args.uploads,
+                "pages": args.pages,
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "seed": args.seed,
+                "llm_stub": args.llm_stub,
+                "llm_first_token_ms": args.llm_first_token_ms,
+                "llm_token_ms": args.llm_token_ms,
+            },
+        },
+        "scenarios": scenarios,
+    }
+
+
+def print_results(results: dict) -> None:
+    for name, scenario in results["scenarios"].items():
+        print(f"{name}: {scenario['requests']} requests in {scenario['duration_s']:.2f}s ({scenario['throughput_rps']:.1f} req/s)")
+        for endpoint, stats in scenario["endpoints"].items():
+            print(
+                f"  {endpoint:<28} n={stats['count']:<5} err={stats['errors']:<3} "
+                f"p50={stats['p50_ms']:8.2f}ms  p95={stats['p95_ms']:8.2f}ms  p99={stats['p99_ms']:8.2f}ms"
+            )
+
+
+def compare(results: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """List regressions against a baseline; latencies must also worsen by min_delta_ms to count"""
+    regressions = []
+    for name, base_scenario in baseline["scenarios"].items():
+        scenario = results["scenarios"].get(name)
+        if scenario is None:
+            continue
+        if scenario["throughput_rps"] < base_scenario["throughput_rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {scenario['throughput_rps']:.1f} req/s vs {base_scenario['throughput_rps']:.1f} baseline"
+            )
+        for endpoint, base_stats in base_scenario["endpoints"].items():
+            stats = scenario["endpoints"].get(endpoint)
+            if stats is None:
+                continue
+            limit = max(base_stats["p95_ms"] * (1 + tolerance), base_stats["p95_ms"] + min_delta_ms)
+            if stats["p95_ms"] > limit:
+                regressions.append(
+                    f"{name} {endpoint}: p95 {stats['p95_ms']:.2f}ms vs {base_stats['p95_ms']:.2f}ms baseline"
+                )
+            if stats["errors"] > base_stats["errors"]:
+                regressions.append(
+                    f"{name} {endpoint}: {stats['errors']} errors vs {base_stats['errors']} baseline"
+                )
+    return regressions
+
+
+def start_llm_stub(args: argparse.Namespace) -> subprocess.Popen:
+    """Start the stub model server and point the LLM backend settings at it"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "benchmarks.llm_stub",
+            "--port", str(port),
+            "--first-token-ms", str(args.llm_first_token_ms),
+            "--token-ms", str(args.llm_token_ms),
+            "--tokens", str(args.llm_tokens),
+        ],
+        cwd=SERVER_DIR
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/v1/models", timeout=1).raise_for_status()
+            break
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    else:
+        process.kill()
+        raise RuntimeError("LLM stub server did not start")
+
+    os.environ["LLM_BACKEND"] = "openai"
+    os.environ["LLM_BASE_URL"] = f"http://127.0.0.1:{port}/v1"
+    return process
+
+
+def main(args: argparse.Namespace) -> int:
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    output = os.path.abspath(args.output) if args.output else None
+
+    # Measure the server, not the per-client rate limits
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    
+    stub = start_llm_stub(args) if args.llm_stub else None
+    
+    # Run against a scratch directory so the load test never touches real uploads
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    sys.path.insert(0, SERVER_DIR)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        results = asyncio.run(run_scenarios(args))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+        if stub is not None:
+            stub.terminate()
+            stub.wait(timeout=10)
+
+    print_results(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {output}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) against {args.baseline}:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=50, help="concurrent logins in the login storm")
+    parser.add_argument("--uploads", type=int, default=20, help="PDFs to upload")
+    parser.add_argument("--pages", type=int, default=10, help="pages per generated PDF")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent uploads and virtual users")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of mixed traffic")
+    parser.add_argument("--seed", type=int, default=1, help="seed for generated documents and traffic")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against a previous JSON results file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (default: 0.2)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="ignore p95 increases smaller than this")
+    parser.add_argument("--llm-stub", action="store_true", help="answer chat through the local OpenAI-compatible stub")
+    parser.add_argument("--llm-first-token-ms", type=float, default=200.0, help="stub delay before the first token")
+    parser.add_argument("--llm-token-ms", type=float, default=20.0, help="stub delay between tokens")
+    parser.add_argument("--llm-tokens", type=int, default=60, help="stub reply length in tokens")
+    sys.exit(main(parser.parse_args()))
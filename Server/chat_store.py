@@ -0,0 +1,203 @@
+import base64
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+from db import connect
+
+logger = logging.getLogger(__name__)
+
+# Attempts at committing a batch before its messages are dropped
+WRITE_ATTEMPTS = 3
+WRITE_RETRY_BACKOFF_SECONDS = 0.1
+
+# Longest a read waits for pending messages to be committed
+FLUSH_TIMEOUT_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    file_id TEXT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_created
+    ON chat_messages (user_id, created_at, id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_file_created
+    ON chat_messages (user_id, file_id, created_at, id);
+"""
+
+
+def encode_cursor(created_at: float, message_id: int) -> str:
+    """Encode a (created_at, id) position as an opaque cursor"""
+    raw = json.dumps([created_at, message_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode an opaque cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(padded))
+        return float(created_at), int(message_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class ChatHistoryStore:
+    """Append-only chat log in SQLite with group commit
+
+    append() only enqueues; a single writer thread drains the queue and commits
+    everything that arrived within GROUP_COMMIT_INTERVAL_MS in one transaction,
+    so the response path never waits on the database.
+    """
+
+    def __init__(self, path: str, commit_interval: float, max_batch: int):
+        self.path = path
+        self.commit_interval = commit_interval
+        self.max_batch = max_batch
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connection(self):
+        """Per-thread connection for reads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_writer(self) -> None:
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._write_loop, name="chat-history-writer", daemon=True)
+                self._writer.start()
+
+    def append(self, user_id: str, role: str, content: str, file_id: Optional[str] = None) -> None:
+        """Queue a message for the next group commit"""
+        self._ensure_writer()
+        self._queue.put((user_id, file_id, role, content, time.time()))
+
+    def flush(self, timeout: float = FLUSH_TIMEOUT_SECONDS) -> bool:
+        """Block until everything appended so far is committed, returning False on timeout"""
+        if self._writer is None:
+            return True
+        self._ensure_writer()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """Flush pending messages and stop the writer thread"""
+        if self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _write_loop(self) -> None:
+        conn = connect(self.path)
+        conn.executescript(SCHEMA)
+        running = True
+        while running:
+            batch = [self._queue.get()]
+            try:
+                # Gather whatever else arrives within the commit window; a flush
+                # marker means a reader is waiting, so commit right away
+                deadline = time.monotonic() + self.commit_interval
+                while len(batch) < self.max_batch and isinstance(batch[-1], tuple):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(self._queue.get(timeout=remaining))
+                    except queue.Empty:
+                        break
+                
+                rows = [item for item in batch if isinstance(item, tuple)]
+                if rows:
+                    self._commit(conn, rows)
+            except Exception:
+                logger.exception("Chat history writer failed on a batch of %d item(s)", len(batch))
+            finally:
+                # Waiting readers are released even if the batch could not be written
+                for item in batch:
+                    if isinstance(item, threading.Event):
+                        item.set()
+                    elif item is None:
+                        running = False
+        conn.close()
+
+    def _commit(self, conn, rows: List[Tuple]) -> None:
+        """Insert a batch in one transaction, retrying transient errors such as a locked database"""
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    "INSERT INTO chat_messages (user_id, file_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                conn.execute("COMMIT")
+                return
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                if attempt == WRITE_ATTEMPTS:
+                    logger.error("Dropped %d chat message(s) after %d failed commits: %s", len(rows), attempt, e)
+                    return
+                logger.warning("Chat history commit failed (attempt %d): %s", attempt, e)
+                time.sleep(WRITE_RETRY_BACKOFF_SECONDS * attempt)
+
+    def get_page(
+        self,
+        user_id: str,
+        limit: int,
+        cursor: Optional[str] = None,
+        file_id: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Get messages newest first, continuing after an opaque cursor
+
+        Returns the page and the cursor for the next page (None at the end).
+        """
+        clauses = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        if file_id is not None:
+            clauses.append("file_id = ?")
+            params.append(file_id)
+        if cursor:
+            created_at, message_id = decode_cursor(cursor)
+            clauses.append("(created_at, id) < (?, ?)")
+            params.extend([created_at, message_id])
+        
+        # Fetch one extra row to know whether another page exists
+        rows = self._connection().execute(
+            f"SELECT id, user_id, file_id, role, content, created_at FROM chat_messages "
+            f"WHERE {' AND '.join(clauses)} ORDER BY created_at DESC, id DESC LIMIT ?",
+            [*params, limit + 1]
+        ).fetchall()
+        
+        messages = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            last = messages[-1]
+            next_cursor = encode_cursor(last["created_at"], last["id"])
+        return messages, next_cursor
+
+
+chat_history_store = ChatHistoryStore(
+    settings.CHAT_HISTORY_DB_PATH,
+    settings.GROUP_COMMIT_INTERVAL_MS / 1000,
+    settings.GROUP_COMMIT_MAX_BATCH
+)
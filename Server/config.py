@@ -12,11 +12,99 @@ class Settings:
     ALGORITHM: str = os.getenv("ALGORITHM", "HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
     REFRESH_TOKEN_EXPIRE_DAYS: int = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))  # decoded tokens kept per worker
+    REVOCATION_BUCKET_SECONDS: int = int(os.getenv("REVOCATION_BUCKET_SECONDS", "300"))
+    # Per-worker filter in front of the shared store, so a token that was never revoked costs no lookup
+    REVOCATION_BLOOM_FILTER: bool = os.getenv("REVOCATION_BLOOM_FILTER", "true").lower() == "true"
+    REVOCATION_BLOOM_CAPACITY: int = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "100000"))
+    
+    # Password Hashing Configuration
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_CONCURRENCY: int = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(min(4, os.cpu_count() or 1))))
     
     # File Upload Configuration
     UPLOAD_DIR: str = "uploads"
+    BLOB_DIR: str = os.path.join(UPLOAD_DIR, "blobs")  # files stored by SHA-256
+    UPLOAD_TEMP_DIR: str = os.path.join(UPLOAD_DIR, "tmp")  # uploads still being written
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     ALLOWED_FILE_TYPES: list = ["application/pdf"]
+    MAX_BATCH_FILES: int = int(os.getenv("MAX_BATCH_FILES", "50"))
+    BATCH_UPLOAD_CONCURRENCY: int = int(os.getenv("BATCH_UPLOAD_CONCURRENCY", "4"))  # parts written at once
+    
+    # Resumable Upload Configuration
+    RESUMABLE_UPLOAD_DIR: str = os.path.join(UPLOAD_DIR, "resumable")
+    RESUMABLE_MAX_FILE_SIZE: int = int(os.getenv("RESUMABLE_MAX_FILE_SIZE", str(500 * 1024 * 1024)))  # 500MB
+    RESUMABLE_UPLOAD_EXPIRE_HOURS: int = int(os.getenv("RESUMABLE_UPLOAD_EXPIRE_HOURS", "24"))
+    RESUMABLE_MAX_SESSIONS_PER_USER: int = int(os.getenv("RESUMABLE_MAX_SESSIONS_PER_USER", "10"))
+    RESUMABLE_MAX_RESERVED_BYTES_PER_USER: int = int(os.getenv("RESUMABLE_MAX_RESERVED_BYTES_PER_USER", str(2 * 1024 * 1024 * 1024)))  # 2GB preallocated at once
+    
+    # Text Extraction Configuration
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+    TEXT_CACHE_DIR: str = os.path.join(UPLOAD_DIR, "text_cache")
+    TEXT_CACHE_MAX_BYTES: int = int(os.getenv("TEXT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 64MB
+    MAX_PAGES_PER_REQUEST: int = int(os.getenv("MAX_PAGES_PER_REQUEST", "100"))
+    
+    # Ingestion Queue Configuration
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))  # jobs processed at once per server process
+    INGESTION_QUEUE_MAX: int = int(os.getenv("INGESTION_QUEUE_MAX", "100"))  # queued jobs before uploads get 503
+    INGESTION_RETRY_AFTER_SECONDS: int = int(os.getenv("INGESTION_RETRY_AFTER_SECONDS", "10"))
+    INGESTION_POLL_INTERVAL_MS: int = int(os.getenv("INGESTION_POLL_INTERVAL_MS", "1000"))
+    
+    # Rate Limiting Configuration
+    # Token buckets per user (or client IP) and route class: CAPACITY requests
+    # in a burst, refilled at PER_MINUTE; 0 disables a class
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "sqlite")  # "sqlite" (shared by workers) or "memory"
+    RATE_LIMIT_LOGIN_CAPACITY: int = int(os.getenv("RATE_LIMIT_LOGIN_CAPACITY", "10"))  # login and register
+    RATE_LIMIT_LOGIN_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_LOGIN_PER_MINUTE", "20"))
+    RATE_LIMIT_UPLOAD_CAPACITY: int = int(os.getenv("RATE_LIMIT_UPLOAD_CAPACITY", "30"))
+    RATE_LIMIT_UPLOAD_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_UPLOAD_PER_MINUTE", "60"))
+    RATE_LIMIT_CHAT_CAPACITY: int = int(os.getenv("RATE_LIMIT_CHAT_CAPACITY", "20"))
+    RATE_LIMIT_CHAT_PER_MINUTE: int = int(os.getenv("RATE_LIMIT_CHAT_PER_MINUTE", "30"))
+    
+    # Retrieval Configuration
+    CHUNK_SIZE: int = int(os.getenv("CHUNK_SIZE", "200"))  # words per chunk
+    CHUNK_OVERLAP: int = int(os.getenv("CHUNK_OVERLAP", "50"))  # words shared by neighbouring chunks
+    RETRIEVAL_TOP_K: int = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")  # "bm25", "dense" or "hybrid"
+    VECTOR_INDEX_DIR: str = os.path.join(UPLOAD_DIR, "vector_index")
+    EMBEDDING_DIM: int = int(os.getenv("EMBEDDING_DIM", "256"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+    # Per-worker LRUs of loaded indexes; evicted ones are rebuilt from the text cache or re-mapped from disk
+    INDEX_CACHE_MAX_BYTES: int = int(os.getenv("INDEX_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 64MB of BM25 postings
+    VECTOR_INDEX_CACHE_MAX_BYTES: int = int(os.getenv("VECTOR_INDEX_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # 256MB mapped
+    
+    # LLM Configuration
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "echo")  # "echo" (offline placeholder) or "openai" (any compatible server)
+    LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "http://127.0.0.1:8001/v1")
+    LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
+    LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
+    LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "512"))
+    LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.2"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "60"))  # longest wait for the next streamed chunk
+    LLM_WRITE_TIMEOUT: float = float(os.getenv("LLM_WRITE_TIMEOUT", "10"))
+    LLM_POOL_TIMEOUT: float = float(os.getenv("LLM_POOL_TIMEOUT", "5"))  # wait for a free pooled connection
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))  # per server process
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    
+    # Answer Cache Configuration
+    # Repeated questions about the same document are answered from memory
+    ANSWER_CACHE_MAX_BYTES: int = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))  # 16MB per worker; 0 disables
+    ANSWER_CACHE_TTL_SECONDS: float = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+    ANSWER_CACHE_VERSION: str = os.getenv("ANSWER_CACHE_VERSION", "1")  # bump to drop answers, e.g. after a model update
+    
+    # Database Configuration
+    DATA_DIR: str = os.getenv("DATA_DIR", "data")
+    METADATA_BACKEND: str = os.getenv("METADATA_BACKEND", "sqlite")  # "sqlite" or "memory"
+    METADATA_DB_PATH: str = os.path.join(DATA_DIR, "metadata.db")
+    USERS_DB_PATH: str = os.path.join(DATA_DIR, "users.db")
+    REVOCATION_DB_PATH: str = os.path.join(DATA_DIR, "revocations.db")
+    RATE_LIMIT_DB_PATH: str = os.path.join(DATA_DIR, "rate_limits.db")
+    CHAT_HISTORY_DB_PATH: str = os.path.join(DATA_DIR, "chat_history.db")
+    INGESTION_QUEUE_DB_PATH: str = os.path.join(DATA_DIR, "ingestion_queue.db")
+    GROUP_COMMIT_INTERVAL_MS: int = int(os.getenv("GROUP_COMMIT_INTERVAL_MS", "10"))
+    GROUP_COMMIT_MAX_BATCH: int = int(os.getenv("GROUP_COMMIT_MAX_BATCH", "500"))
     
     # API Configuration
     API_V1_PREFIX: str = "/api/v1"
@@ -24,6 +112,12 @@ class Settings:
     VERSION: str = "1.0.0"
     DESCRIPTION: str = "FastAPI backend for PDF upload and chat functionality"
     
+    # Startup Configuration
+    # Serve as soon as the app is up and warm caches in the background;
+    # set to false to finish warming up before accepting requests
+    FAST_STARTUP: bool = os.getenv("FAST_STARTUP", "true").lower() == "true"
+    WARMUP_MAX_FILES: int = int(os.getenv("WARMUP_MAX_FILES", "100"))  # most recent uploads whose cached text is loaded on startup
+    
     # CORS Configuration
     CORS_ORIGINS: list = [
         "http://localhost:3000",
@@ -35,6 +129,3 @@ class Settings:
 
 # Create settings instance
 settings = Settings()
-
-# Ensure upload directory exists
-os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
@@ -0,0 +1,54 @@
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Optional
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Open a SQLite connection tuned for a concurrent web server"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers run alongside the writer; NORMAL skips the fsync on every commit
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class LazyConnection:
+    """A connection that is opened, and its schema set up, on first use
+
+    Stores are module-level singletons, so opening their databases in the
+    constructor would create `DATA_DIR` and every database file as a side
+    effect of importing the app. Attribute access is forwarded to the real
+    connection. `setup` gets the new connection and must use it directly.
+    """
+
+    def __init__(self, path: str, setup: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.path = path
+        self._setup = setup
+        self._conn: Optional[sqlite3.Connection] = None
+        self._open_lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        conn = self._conn
+        if conn is not None:
+            return conn
+        with self._open_lock:
+            if self._conn is None:
+                conn = connect(self.path)
+                try:
+                    if self._setup is not None:
+                        self._setup(conn)
+                except Exception:
+                    conn.close()
+                    raise
+                self._conn = conn
+            return self._conn
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.get(), name)
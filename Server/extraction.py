@@ -0,0 +1,62 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+from config import settings
+
+# Process pool for PDF parsing
+# PDF parsing is CPU-bound and holds the GIL, so it must never run on the event loop
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_extraction_executor() -> ProcessPoolExecutor:
+    """Get (or lazily create) the shared extraction process pool"""
+    global _extraction_executor
+    if _extraction_executor is None:
+        _extraction_executor = ProcessPoolExecutor(max_workers=settings.EXTRACTION_WORKERS)
+    return _extraction_executor
+
+
+def shutdown_extraction_executor() -> None:
+    """Shut down the extraction process pool"""
+    global _extraction_executor
+    if _extraction_executor is not None:
+        _extraction_executor.shutdown(wait=False, cancel_futures=True)
+        _extraction_executor = None
+
+
+def extract_pages(file_path: str) -> List[str]:
+    """Extract text from every page of a PDF (runs inside a worker process)"""
+    # Imported here so only the worker processes pay for loading the parser
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    return [page.extract_text() or "" for page in reader.pages]
+
+
+def extract_page_range(file_path: str, start: int, end: int) -> Tuple[int, List[str]]:
+    """Extract pages start..end (0-based, exclusive end) and return them with the page count"""
+    from pypdf import PdfReader
+
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+    return page_count, [reader.pages[i].extract_text() or "" for i in range(start, min(end, page_count))]
+
+
+async def extract_text(file_path: str) -> List[str]:
+    """Extract per-page text from a PDF without blocking the event loop"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_extraction_executor(), extract_pages, file_path)
+
+
+async def extract_text_range(file_path: str, start: int, end: int) -> Tuple[int, List[str]]:
+    """Extract only some pages of a PDF without blocking the event loop"""
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(file_path)
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_extraction_executor(), extract_page_range, file_path, start, end)
@@ -1,16 +1,21 @@
 import os
 import uuid
+import asyncio
+import hashlib
+import time
 import aiofiles
+from contextlib import ExitStack, contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from fastapi import HTTPException, status, UploadFile
 
 from config import settings
+from metrics import record_upload
 from models import PDFMetadata
-
-# In-memory storage for PDF metadata
-# TODO: Replace with actual database implementation
-pdf_files_db: Dict[str, PDFMetadata] = {}
+from ingestion import invalidate_document
+from ingestion_queue import ingestion_queue
+from locks import file_lock
+from metadata_store import FileCursor, metadata_store
 
 
 def generate_unique_filename(original_filename: str) -> str:
@@ -20,6 +25,43 @@ def generate_unique_filename(original_filename: str) -> str:
     return f"{file_id}{file_extension}"
 
 
+def get_blob_path(content_hash: str) -> str:
+    """Get the content-addressed path for a file's bytes"""
+    return os.path.join(settings.BLOB_DIR, content_hash[:2], f"{content_hash}.pdf")
+
+
+def get_blob_lock_path(content_hash: str) -> str:
+    """Get the lock file guarding a blob (blobs sharing a hash prefix share it)"""
+    return os.path.join(settings.BLOB_DIR, content_hash[:2], ".lock")
+
+
+@contextmanager
+def blob_locks(content_hashes: Iterable[str]) -> Iterator[None]:
+    """Hold the locks of several blobs across server processes
+
+    Publishing a blob and taking a reference on it, and dropping the last
+    reference and unlinking the blob, each happen under the blob's lock, so a
+    delete in one worker can never remove bytes another worker just deduplicated
+    against. Locks are taken in sorted order so two batches can't deadlock.
+    """
+    with ExitStack() as stack:
+        for path in sorted({get_blob_lock_path(content_hash) for content_hash in content_hashes if content_hash}):
+            stack.enter_context(file_lock(path))
+        yield
+
+
+def store_blob(temp_path: str, content_hash: str) -> str:
+    """Move a fully written upload into blob storage, deduplicating identical bytes (blob lock held)"""
+    blob_path = get_blob_path(content_hash)
+    if os.path.exists(blob_path):
+        # Same bytes already stored; the new upload just shares the blob
+        os.remove(temp_path)
+    else:
+        os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+        os.replace(temp_path, blob_path)
+    return blob_path
+
+
 def validate_pdf_file(file: UploadFile) -> None:
     """Validate uploaded PDF file"""
     # Check file type
@@ -38,24 +80,30 @@ def validate_pdf_file(file: UploadFile) -> None:
         )
 
 
-async def save_uploaded_file(file: UploadFile, user_id: str) -> PDFMetadata:
-    """Save uploaded file to disk and store metadata"""
+async def write_upload(file: UploadFile) -> Tuple[str, str, int]:
+    """Stream an upload to a temp file, hashing it on the way
+
+    Returns (temp_path, content_hash, file_size).
+    """
     # Validate file
     validate_pdf_file(file)
     
-    # Generate unique filename
+    # Write to a unique temp file first; the final name is the content hash
     unique_filename = generate_unique_filename(file.filename)
-    file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
+    file_path = os.path.join(settings.UPLOAD_TEMP_DIR, unique_filename)
     
     # Ensure upload directory exists
-    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
     
     try:
         # Save file to disk
+        started = time.perf_counter()
         file_size = 0
+        hasher = hashlib.sha256()
         async with aiofiles.open(file_path, 'wb') as buffer:
             while chunk := await file.read(8192):  # Read in 8KB chunks
                 file_size += len(chunk)
+                hasher.update(chunk)
                 
                 # Check file size during upload
                 if file_size > settings.MAX_FILE_SIZE:
@@ -68,23 +116,10 @@ async def save_uploaded_file(file: UploadFile, user_id: str) -> PDFMetadata:
                 
                 await buffer.write(chunk)
         
-        # Create metadata
-        file_id = str(uuid.uuid4())
-        metadata = PDFMetadata(
-            file_id=file_id,
-            filename=unique_filename,
-            original_filename=file.filename,
-            file_size=file_size,
-            content_type=file.content_type,
-            upload_time=datetime.utcnow(),
-            user_id=user_id,
-            file_path=file_path
-        )
-        
-        # Store metadata in database
-        pdf_files_db[file_id] = metadata
+        record_upload("multipart", file_size, time.perf_counter() - started)
         
-        return metadata
+        # Hashed during the write loop, so no second pass over the data
+        return file_path, hasher.hexdigest(), file_size
         
     except Exception as e:
         # Clean up file if something went wrong
@@ -100,21 +135,179 @@ async def save_uploaded_file(file: UploadFile, user_id: str) -> PDFMetadata:
         )
 
 
-def get_user_files(user_id: str) -> List[PDFMetadata]:
-    """Get all files uploaded by a specific user"""
-    user_files = []
-    for metadata in pdf_files_db.values():
-        if metadata.user_id == user_id:
-            user_files.append(metadata)
+def build_metadata(
+    blob_path: str,
+    content_hash: str,
+    file_size: int,
+    original_filename: str,
+    content_type: str,
+    user_id: str
+) -> PDFMetadata:
+    """Create metadata for a file stored in blob storage"""
+    return PDFMetadata(
+        file_id=str(uuid.uuid4()),
+        filename=os.path.basename(blob_path),
+        original_filename=original_filename,
+        file_size=file_size,
+        content_type=content_type,
+        upload_time=datetime.utcnow(),
+        user_id=user_id,
+        file_path=blob_path,
+        content_hash=content_hash
+    )
+
+
+async def save_uploaded_file(file: UploadFile, user_id: str) -> PDFMetadata:
+    """Save uploaded file to content-addressed storage and store metadata"""
+    temp_path, content_hash, file_size = await write_upload(file)
+    try:
+        return await register_file(
+            temp_path, content_hash, file_size, file.filename, file.content_type, user_id
+        )
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        
+        if isinstance(e, HTTPException):
+            raise e
+        
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save file: {str(e)}"
+        )
+
+
+async def save_uploaded_files(
+    files: List[UploadFile],
+    user_id: str
+) -> List[Union[PDFMetadata, HTTPException]]:
+    """Save several uploads concurrently and store all their metadata in one transaction
+
+    Returns, per file, its metadata or the HTTPException it failed with.
+    Every stored file gets its own ingestion job, so each has a status to
+    poll; the jobs are queued together in one enqueue.
+    """
+    semaphore = asyncio.Semaphore(settings.BATCH_UPLOAD_CONCURRENCY)
     
-    # Sort by upload time (newest first)
-    user_files.sort(key=lambda x: x.upload_time, reverse=True)
-    return user_files
+    async def write_one(file: UploadFile) -> Tuple[str, str, int]:
+        async with semaphore:
+            return await write_upload(file)
+    
+    written = await asyncio.gather(*(write_one(file) for file in files), return_exceptions=True)
+    
+    results: List[Union[PDFMetadata, HTTPException, None]] = []
+    written_files: List[Tuple[str, str, int, str, str]] = []
+    for file, outcome in zip(files, written):
+        if isinstance(outcome, HTTPException):
+            results.append(outcome)
+            continue
+        if isinstance(outcome, Exception):
+            results.append(HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to save file: {str(outcome)}"
+            ))
+            continue
+        
+        temp_path, content_hash, file_size = outcome
+        written_files.append((temp_path, content_hash, file_size, file.filename, file.content_type))
+        results.append(None)
+    
+    try:
+        published = await asyncio.to_thread(publish_files, written_files, user_id)
+    except Exception:
+        for temp_path, *_ in written_files:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        raise
+    
+    stored = [outcome for outcome in published if isinstance(outcome, PDFMetadata)]
+    if stored:
+        await asyncio.to_thread(ingestion_queue.enqueue, [metadata.file_id for metadata in stored])
+    
+    # Fill the published outcomes into their slots, in upload order
+    published_iter = iter(published)
+    return [next(published_iter) if outcome is None else outcome for outcome in results]
+
+
+def publish_files(
+    written_files: List[Tuple[str, str, int, str, str]],
+    user_id: str
+) -> List[Union[PDFMetadata, HTTPException]]:
+    """Move written uploads into blob storage and store their metadata in one transaction
+
+    `written_files` holds (temp_path, content_hash, file_size, original_filename,
+    content_type) per upload. Returns, per upload, its metadata or the
+    HTTPException it failed with; a file that can't be moved into storage is
+    cleaned up without failing the others. Runs under the blobs' locks, so
+    call it off the event loop.
+    """
+    with blob_locks(content_hash for _, content_hash, *_ in written_files):
+        outcomes: List[Union[PDFMetadata, HTTPException]] = []
+        for temp_path, content_hash, file_size, original_filename, content_type in written_files:
+            try:
+                blob_path = store_blob(temp_path, content_hash)
+            except Exception as e:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                outcomes.append(HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail=f"Failed to save file: {str(e)}"
+                ))
+                continue
+            outcomes.append(build_metadata(blob_path, content_hash, file_size, original_filename, content_type, user_id))
+        
+        stored = [outcome for outcome in outcomes if isinstance(outcome, PDFMetadata)]
+        try:
+            # Also takes a reference on each blob
+            metadata_store.add_many(stored)
+        except Exception:
+            # Nothing was committed; drop blobs that no other file references
+            for metadata in stored:
+                if metadata_store.blob_refcount(metadata.content_hash) == 0 and os.path.exists(metadata.file_path):
+                    os.remove(metadata.file_path)
+            raise
+    return outcomes
+
+
+async def register_file(
+    temp_path: str,
+    content_hash: str,
+    file_size: int,
+    original_filename: str,
+    content_type: str,
+    user_id: str
+) -> PDFMetadata:
+    """Move a fully written upload into blob storage, store its metadata and queue it for ingestion"""
+    [metadata] = await asyncio.to_thread(
+        publish_files, [(temp_path, content_hash, file_size, original_filename, content_type)], user_id
+    )
+    if isinstance(metadata, HTTPException):
+        raise metadata
+    
+    # Extraction and indexing run on the ingestion workers, not in the request
+    await asyncio.to_thread(ingestion_queue.enqueue, [metadata.file_id])
+    
+    return metadata
+
+
+def get_user_files(user_id: str, limit: Optional[int] = None, after: Optional[FileCursor] = None) -> List[PDFMetadata]:
+    """Get files uploaded by a specific user, newest first (sorted by the store's index)"""
+    return metadata_store.list_user_files(user_id, limit, after)
+
+
+def get_user_file_totals(user_id: str) -> Tuple[int, int]:
+    """Get (file count, total bytes) for a specific user"""
+    return metadata_store.user_totals(user_id)
+
+
+def get_recent_user_files(user_id: str) -> List[PDFMetadata]:
+    """Get a user's most recent files (last 5)"""
+    return metadata_store.recent_user_files(user_id)
 
 
 def get_file_metadata(file_id: str, user_id: str) -> Optional[PDFMetadata]:
     """Get metadata for a specific file"""
-    metadata = pdf_files_db.get(file_id)
+    metadata = metadata_store.get(file_id)
     
     if not metadata:
         return None
@@ -126,7 +319,7 @@ def get_file_metadata(file_id: str, user_id: str) -> Optional[PDFMetadata]:
     return metadata
 
 
-def delete_file(file_id: str, user_id: str) -> bool:
+async def delete_file(file_id: str, user_id: str) -> bool:
     """Delete a file and its metadata"""
     metadata = get_file_metadata(file_id, user_id)
     
@@ -134,26 +327,41 @@ def delete_file(file_id: str, user_id: str) -> bool:
         return False
     
     try:
-        # Remove file from disk
-        if os.path.exists(metadata.file_path):
-            os.remove(metadata.file_path)
-        
-        # Remove metadata from database
-        del pdf_files_db[file_id]
-        
+        await asyncio.to_thread(remove_file, metadata)
+        await asyncio.to_thread(ingestion_queue.remove, file_id)
         return True
         
     except Exception:
         return False
 
 
+def remove_file(metadata: PDFMetadata) -> None:
+    """Drop a file's metadata and, with its last reference, the blob, extracted text and indexes
+
+    Runs under the blob's lock, so call it off the event loop.
+    """
+    with blob_locks([metadata.content_hash]):
+        # Remove metadata from database (also drops its reference on the blob)
+        metadata_store.delete(metadata.file_id)
+        
+        if not metadata.content_hash or metadata_store.blob_refcount(metadata.content_hash) == 0:
+            if os.path.exists(metadata.file_path):
+                os.remove(metadata.file_path)
+            if metadata.content_hash:
+                invalidate_document(metadata.content_hash)
+
+
 def get_file_stats() -> Dict[str, int]:
     """Get file statistics (for admin/debugging)"""
-    total_files = len(pdf_files_db)
-    total_size = sum(metadata.file_size for metadata in pdf_files_db.values())
+    total_files, total_size = metadata_store.totals()
     
     return {
         "total_files": total_files,
         "total_size_bytes": total_size,
         "total_size_mb": round(total_size / (1024 * 1024), 2)
     }
+
+
+def rebuild_file_stats() -> int:
+    """Rebuild the maintained upload counters from stored metadata, returning how many had drifted"""
+    return metadata_store.rebuild_stats()
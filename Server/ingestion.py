@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import time
+from typing import TYPE_CHECKING, Awaitable, Callable, List, Optional, Tuple
+
+from config import settings
+from models import PDFMetadata, RetrievedChunk
+from metrics import stage_latency
+from extraction import extract_text, extract_text_range, get_extraction_executor
+from retrieval import BM25Index, IndexCache, build_index, reciprocal_rank_fusion
+from text_cache import ExtractedText, text_cache
+from answer_cache import answer_cache
+
+if TYPE_CHECKING:
+    # numpy-backed; imported on first use so it stays off the startup path
+    from vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+# BM25 indexes keyed by content hash
+document_indexes = IndexCache(settings.INDEX_CACHE_MAX_BYTES)
+
+# Memory-mapped dense vector indexes keyed by content hash
+vector_indexes = IndexCache(settings.VECTOR_INDEX_CACHE_MAX_BYTES)
+
+
+async def load_text(metadata: PDFMetadata) -> Optional[ExtractedText]:
+    """Get extracted text for a file, parsing the PDF only on a cache miss"""
+    # Disk reads and writes of the cache happen in a thread
+    extracted = await asyncio.to_thread(text_cache.get, metadata.content_hash)
+    if extracted is not None:
+        return extracted
+    
+    started = time.perf_counter()
+    try:
+        pages = await extract_text(metadata.file_path)
+    except Exception as e:
+        # A PDF we cannot parse is still a valid upload; chat just has no context for it
+        logger.warning("Text extraction failed for %s: %s", metadata.file_id, e)
+        return None
+    
+    stage_latency.observe(time.perf_counter() - started, "extraction")
+    
+    extracted = ExtractedText.from_pages(pages)
+    await asyncio.to_thread(text_cache.put, metadata.content_hash, extracted)
+    return extracted
+
+
+async def load_pages(metadata: PDFMetadata, start: int, end: int) -> Tuple[int, List[str], bool]:
+    """Get (page count, pages start..end, whether they came from the text cache)
+
+    On a cache miss only the requested pages are parsed; the caller should
+    schedule full ingestion so later requests are served from the cache.
+    """
+    cached = await asyncio.to_thread(text_cache.get_pages, metadata.content_hash, start, end)
+    if cached is not None:
+        page_count, pages = cached
+        return page_count, pages, True
+    
+    started = time.perf_counter()
+    page_count, pages = await extract_text_range(metadata.file_path, start, end)
+    stage_latency.observe(time.perf_counter() - started, "page_extraction")
+    return page_count, pages, False
+
+
+async def load_index(metadata: PDFMetadata) -> Optional[BM25Index]:
+    """Get the BM25 index for a file, building it off the event loop if needed"""
+    index = document_indexes.get(metadata.content_hash)
+    if index is not None:
+        return index
+    
+    extracted = await load_text(metadata)
+    if extracted is None:
+        return None
+    
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    index = await loop.run_in_executor(get_extraction_executor(), build_index, extracted)
+    stage_latency.observe(time.perf_counter() - started, "indexing")
+    document_indexes.put(metadata.content_hash, index)
+    return index
+
+
+async def load_vector_index(metadata: PDFMetadata) -> Optional["VectorIndex"]:
+    """Get the dense vector index for a file, embedding its chunks off the event loop if needed"""
+    from vector_index import VectorIndex, build_document_vectors
+    
+    vectors = vector_indexes.get(metadata.content_hash)
+    if vectors is not None:
+        return vectors
+    
+    vectors = VectorIndex.load(metadata.content_hash)
+    if vectors is None:
+        extracted = await load_text(metadata)
+        if extracted is None:
+            return None
+        
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            get_extraction_executor(), build_document_vectors, metadata.content_hash, extracted
+        )
+        stage_latency.observe(time.perf_counter() - started, "embedding")
+        vectors = VectorIndex.load(metadata.content_hash)
+    
+    if vectors is not None:
+        vector_indexes.put(metadata.content_hash, vectors)
+    return vectors
+
+
+async def ingest_file(metadata: PDFMetadata, on_progress: Optional[Callable[[float], Awaitable[None]]] = None) -> bool:
+    """Run the ingestion stages for an uploaded file: text extraction, chunking and indexing
+
+    Returns False if no text could be extracted. `on_progress` is awaited with
+    the fraction of the work done after each stage.
+    """
+    if await load_text(metadata) is None:
+        return False
+    if on_progress:
+        await on_progress(0.5)
+    
+    await load_index(metadata)
+    if settings.RETRIEVAL_MODE != "bm25":
+        if on_progress:
+            await on_progress(0.75)
+        await load_vector_index(metadata)
+    return True
+
+
+async def search_file(metadata: PDFMetadata, query: str, top_k: int = settings.RETRIEVAL_TOP_K) -> List[RetrievedChunk]:
+    """Get the chunks of a file most relevant to a query"""
+    index = await load_index(metadata)
+    extracted = await load_text(metadata) if index is not None else None
+    if extracted is None:
+        return []
+    
+    vectors = await load_vector_index(metadata) if settings.RETRIEVAL_MODE != "bm25" else None
+    
+    # Timed separately from loading so the histogram reflects query cost alone
+    started = time.perf_counter()
+    if settings.RETRIEVAL_MODE == "bm25":
+        hits = index.search(query, top_k)
+    else:
+        dense_hits = vectors.search(query, top_k * 4) if vectors else []
+        if settings.RETRIEVAL_MODE == "dense":
+            hits = dense_hits[:top_k]
+        else:
+            # Fuse lexical and dense rankings over a wider candidate set
+            hits = reciprocal_rank_fusion([index.search(query, top_k * 4), dense_hits], top_k)
+    stage_latency.observe(time.perf_counter() - started, "retrieval")
+    
+    return [
+        RetrievedChunk(
+            chunk_id=chunk_id,
+            page=index.chunk_pages[chunk_id] + 1,
+            score=round(score, 4),
+            text=index.chunk_text(extracted, chunk_id)
+        )
+        for chunk_id, score in hits
+    ]
+
+
+def invalidate_document(content_hash: str) -> None:
+    """Drop cached text, indexes and answers for a document"""
+    answer_cache.invalidate(content_hash)
+    document_indexes.pop(content_hash)
+    vector_indexes.pop(content_hash)
+    from vector_index import remove_vector_index
+    remove_vector_index(content_hash)
+    text_cache.invalidate(content_hash)
@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from db import LazyConnection
+from models import PDFMetadata
+
+logger = logging.getLogger(__name__)
+
+# Job states, in the order a job moves through them
+QUEUED = "queued"
+PROCESSING = "processing"
+READY = "ready"
+FAILED = "failed"
+
+# Pause after an unexpected worker error so a failing database isn't retried in a tight loop
+WORKER_ERROR_BACKOFF_SECONDS = 1.0
+
+
+class IngestionQueue:
+    """Durable queue of ingestion jobs in SQLite, drained by a pool of async workers
+
+    Uploads only enqueue a row; workers claim jobs with a single UPDATE, so
+    several server processes can share the same queue. Each claimed job
+    records the process that took it, and jobs whose process is gone (the
+    server stopped or crashed mid-job) are put back in the queue on start.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS ingestion_jobs (
+        file_id TEXT PRIMARY KEY,
+        status TEXT NOT NULL,
+        progress REAL NOT NULL DEFAULT 0,
+        error TEXT,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        worker_pid INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_status_created
+        ON ingestion_jobs (status, created_at);
+    """
+
+    def __init__(self, path: str, workers: int, max_queued: int):
+        self.path = path
+        self.workers = workers
+        self.max_queued = max_queued
+        self._conn = LazyConnection(path, self._setup)
+        self._lock = threading.Lock()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def _setup(self, conn) -> None:
+        conn.executescript(self.SCHEMA)
+        # Queues created before jobs recorded their process lack the column
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(ingestion_jobs)")}
+        if "worker_pid" not in columns:
+            conn.execute("ALTER TABLE ingestion_jobs ADD COLUMN worker_pid INTEGER")
+
+    def enqueue(self, file_ids: List[str]) -> None:
+        """Queue files for ingestion; files that already have a pending job are left alone"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO ingestion_jobs (file_id, status, progress, error, created_at, updated_at) "
+                    "VALUES (?, ?, 0, NULL, ?, ?) "
+                    "ON CONFLICT (file_id) DO UPDATE SET status = excluded.status, progress = 0, error = NULL, "
+                    "created_at = excluded.created_at, updated_at = excluded.updated_at "
+                    "WHERE ingestion_jobs.status IN (?, ?)",
+                    [(file_id, QUEUED, now, now, READY, FAILED) for file_id in file_ids]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def queued_count(self) -> int:
+        """Get the number of jobs waiting for a worker"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM ingestion_jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()[0]
+
+    def is_saturated(self, incoming: int = 1) -> bool:
+        """Whether accepting `incoming` more jobs would exceed the queue limit"""
+        return self.queued_count() + incoming > self.max_queued
+
+    def get_status(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job's status, progress and, while queued, its position in the queue"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_id, status, progress, error, created_at, updated_at FROM ingestion_jobs WHERE file_id = ?",
+                (file_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            job["queue_position"] = None
+            if job["status"] == QUEUED:
+                job["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM ingestion_jobs WHERE status = ? AND created_at <= ?",
+                    (QUEUED, job["created_at"])
+                ).fetchone()[0]
+        return job
+
+    def remove(self, file_id: str) -> None:
+        """Drop a file's job, e.g. when the file is deleted"""
+        with self._lock:
+            self._conn.execute("DELETE FROM ingestion_jobs WHERE file_id = ?", (file_id,))
+
+    def stats(self) -> Dict[str, int]:
+        """Get job counts by status"""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM ingestion_jobs GROUP BY status"
+            ).fetchall())
+        return {
+            "workers": self.workers,
+            "max_queued": self.max_queued,
+            **{state: counts.get(state, 0) for state in (QUEUED, PROCESSING, READY, FAILED)},
+        }
+
+    def _claim(self) -> Optional[str]:
+        """Atomically move the oldest queued job to processing"""
+        with self._lock:
+            row = self._conn.execute(
+                "UPDATE ingestion_jobs SET status = ?, progress = 0, updated_at = ?, worker_pid = ? "
+                "WHERE file_id = (SELECT file_id FROM ingestion_jobs WHERE status = ? ORDER BY created_at LIMIT 1) "
+                "AND status = ? RETURNING file_id",
+                (PROCESSING, time.time(), os.getpid(), QUEUED, QUEUED)
+            ).fetchone()
+        return row["file_id"] if row else None
+
+    def _update(self, file_id: str, status: str, progress: float, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE ingestion_jobs SET status = ?, progress = ?, error = ?, updated_at = ? WHERE file_id = ?",
+                (status, progress, error, time.time(), file_id)
+            )
+
+    async def _run(self, file_id: str) -> None:
+        # Imported here to avoid a cycle: file lookups live in metadata_store, stages in ingestion
+        from ingestion import ingest_file
+        from metadata_store import metadata_store
+
+        metadata: Optional[PDFMetadata] = await asyncio.to_thread(metadata_store.get, file_id)
+        if metadata is None:
+            # Deleted while queued
+            await asyncio.to_thread(self.remove, file_id)
+            return
+
+        async def report(progress: float) -> None:
+            await asyncio.to_thread(self._update, file_id, PROCESSING, progress)
+
+        try:
+            indexed = await ingest_file(metadata, report)
+        except Exception as e:
+            logger.warning("Ingestion failed for %s: %s", file_id, e)
+            await asyncio.to_thread(self._update, file_id, FAILED, 0, str(e))
+            return
+
+        if await asyncio.to_thread(self._discard_if_deleted, metadata):
+            return
+
+        if indexed:
+            await asyncio.to_thread(self._update, file_id, READY, 1.0)
+        else:
+            await asyncio.to_thread(self._update, file_id, FAILED, 0, "No text could be extracted from the PDF")
+
+    def _discard_if_deleted(self, metadata: PDFMetadata) -> bool:
+        """Drop a job's results if its file was deleted while it ran, returning whether it was
+
+        A delete that lands mid-job invalidates the document before ingestion
+        has written its text and indexes, so the check is repeated here under
+        the blob lock, where it can't interleave with a delete or a re-upload.
+        """
+        from file_utils import blob_locks
+        from ingestion import invalidate_document
+        from metadata_store import metadata_store
+
+        with blob_locks([metadata.content_hash]):
+            if metadata_store.get(metadata.file_id) is not None:
+                return False
+            if metadata.content_hash and metadata_store.blob_refcount(metadata.content_hash) == 0:
+                invalidate_document(metadata.content_hash)
+        self.remove(metadata.file_id)
+        return True
+
+    async def _wait_for_work(self) -> None:
+        # Woken by enqueue in this process, or by polling for jobs queued by other workers
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), settings.INGESTION_POLL_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self) -> None:
+        # wait_for can swallow a cancel that races with a wakeup, so stop() also sets a flag
+        while not self._stopping:
+            file_id = None
+            try:
+                file_id = await asyncio.to_thread(self._claim)
+                if file_id is None:
+                    await self._wait_for_work()
+                    continue
+                await self._run(file_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # A dead worker would leave jobs queued until uploads are turned away, so keep going
+                logger.exception("Ingestion worker error while handling %s", file_id or "the queue")
+                if file_id is not None:
+                    try:
+                        await asyncio.to_thread(self._update, file_id, FAILED, 0, "Internal error during ingestion")
+                    except Exception:
+                        logger.exception("Could not mark ingestion job %s as failed", file_id)
+                await asyncio.sleep(WORKER_ERROR_BACKOFF_SECONDS)
+
+    @staticmethod
+    def _process_alive(pid: Optional[int]) -> bool:
+        if pid is None:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def requeue_orphaned(self) -> int:
+        """Put back jobs claimed by processes that no longer exist, returning how many"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT file_id, worker_pid FROM ingestion_jobs WHERE status = ?", (PROCESSING,)
+            ).fetchall()
+            orphaned = [
+                (QUEUED, row["file_id"]) for row in rows
+                if row["worker_pid"] == os.getpid() or not self._process_alive(row["worker_pid"])
+            ]
+            self._conn.executemany(
+                "UPDATE ingestion_jobs SET status = ?, progress = 0, worker_pid = NULL WHERE file_id = ?", orphaned
+            )
+        return len(orphaned)
+
+    def start(self) -> None:
+        """Requeue interrupted jobs and start the workers (call from the running event loop)"""
+        # Other server processes may be mid-job, so only take back jobs whose process is gone
+        self.requeue_orphaned()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers; jobs they were running are requeued on the next start"""
+        self._stopping = True
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._wakeup = None
+
+
+ingestion_queue = IngestionQueue(
+    settings.INGESTION_QUEUE_DB_PATH,
+    settings.INGESTION_WORKERS,
+    settings.INGESTION_QUEUE_MAX
+)
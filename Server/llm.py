@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional
+
+from config import settings
+from metrics import stage_latency
+from models import PDFMetadata, RetrievedChunk
+
+if TYPE_CHECKING:
+    # Only the OpenAI-compatible backend needs it; imported on first use so it stays off the startup path
+    import httpx
+
+SYSTEM_PROMPT = (
+    "You answer questions about the user's PDF documents. Base your answer on the "
+    "passages provided, cite the page numbers you used, and say so when the passages "
+    "do not contain the answer."
+)
+
+
+class LLMError(Exception):
+    """Raised when the model backend fails or returns an error"""
+
+
+class LLMBackend:
+    """Interface for chat model backends
+
+    A backend turns a question and the retrieved passages into a streamed
+    reply; how the prompt is built and where it is sent is up to the backend,
+    so routes never see either.
+    """
+
+    name = "base"
+
+    def build_messages(
+        self,
+        question: str,
+        metadata: Optional[PDFMetadata],
+        sources: List[RetrievedChunk]
+    ) -> List[Dict[str, str]]:
+        """Assemble chat messages from the question and the retrieved passages
+
+        The file's name is left out: answers are cached per document content
+        and shared by everyone who uploaded the same bytes under any name.
+        """
+        if metadata and sources:
+            passages = "\n\n".join(f"[Page {source.page}] {source.text}" for source in sources)
+            content = f"Passages from the document:\n{passages}\n\nQuestion: {question}"
+        elif metadata:
+            content = f"No passages in the document matched the question.\n\nQuestion: {question}"
+        else:
+            content = question
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": content},
+        ]
+
+    def stream_reply(
+        self,
+        question: str,
+        metadata: Optional[PDFMetadata],
+        sources: List[RetrievedChunk]
+    ) -> AsyncIterator[str]:
+        """Produce the reply token by token"""
+        raise NotImplementedError
+
+    async def start(self) -> None:
+        """Open connections (called from the lifespan)"""
+
+    async def close(self) -> None:
+        """Release connections (called from the lifespan)"""
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.name}
+
+
+class EchoBackend(LLMBackend):
+    """Offline placeholder that describes the retrieved passages instead of calling a model
+
+    Like a model's answer, the reply depends only on the document and the
+    question, never on who asked or what they named the file.
+    """
+
+    name = "echo"
+
+    async def stream_reply(
+        self,
+        question: str,
+        metadata: Optional[PDFMetadata],
+        sources: List[RetrievedChunk]
+    ) -> AsyncIterator[str]:
+        response_message = "I received your message."
+
+        if metadata and sources:
+            pages = ", ".join(str(page) for page in sorted({source.page for source in sources}))
+            response_message += f" The most relevant passages in the document are on page(s) {pages}: "
+            response_message += f"\"{sources[0].text[:300]}\" "
+            response_message += "Set LLM_BACKEND=openai to have a model analyze these passages."
+        elif metadata:
+            response_message += " I couldn't find any passages in the referenced document relevant to your message."
+        else:
+            response_message += " To get insights about a specific document, please upload a PDF first and reference its file_id in your message."
+
+        for token in response_message.split(" "):
+            yield token + " "
+            # Give other requests a turn between tokens, as a real model client would
+            await asyncio.sleep(0)
+
+
+class OpenAICompatibleBackend(LLMBackend):
+    """Streams from any server implementing the OpenAI chat completions API
+
+    Each worker process keeps one pooled AsyncClient, so requests reuse
+    keep-alive connections instead of paying a TCP (and TLS) handshake per
+    message. The pool size and every timeout come from settings.
+    """
+
+    name = "openai"
+
+    def __init__(self, base_url: str, api_key: str, model: str):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # Created on first use if the lifespan didn't, so it binds to the running loop
+        if self._client is None:
+            import httpx
+
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=httpx.Timeout(
+                    connect=settings.LLM_CONNECT_TIMEOUT,
+                    read=settings.LLM_READ_TIMEOUT,
+                    write=settings.LLM_WRITE_TIMEOUT,
+                    pool=settings.LLM_POOL_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS
+                )
+            )
+        return self._client
+
+    async def start(self) -> None:
+        self._get_client()
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def stream_reply(
+        self,
+        question: str,
+        metadata: Optional[PDFMetadata],
+        sources: List[RetrievedChunk]
+    ) -> AsyncIterator[str]:
+        import httpx
+
+        payload = {
+            "model": self.model,
+            "messages": self.build_messages(question, metadata, sources),
+            "max_tokens": settings.LLM_MAX_TOKENS,
+            "temperature": settings.LLM_TEMPERATURE,
+            "stream": True,
+        }
+        started = time.perf_counter()
+        first_token = True
+
+        try:
+            async with self._get_client().stream("POST", "/chat/completions", json=payload) as response:
+                if response.status_code >= 400:
+                    body = (await response.aread()).decode("utf-8", "replace")
+                    raise LLMError(f"Model backend returned {response.status_code}: {body[:200]}")
+
+                # Server-sent events: one `data:` line per chunk, ending with `data: [DONE]`.
+                # The body is read to the end, since a half-read response can't go back to the pool
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        continue
+                    choices = json.loads(data).get("choices") or [{}]
+                    token = (choices[0].get("delta") or {}).get("content")
+                    if token:
+                        if first_token:
+                            stage_latency.observe(time.perf_counter() - started, "llm_first_token")
+                            first_token = False
+                        yield token
+        except httpx.TimeoutException as e:
+            raise LLMError(f"Model backend timed out: {type(e).__name__}") from e
+        except httpx.HTTPError as e:
+            raise LLMError(f"Model backend request failed: {e}") from e
+        finally:
+            stage_latency.observe(time.perf_counter() - started, "llm_generation")
+
+    def stats(self) -> Dict[str, object]:
+        return {"backend": self.name, "base_url": self.base_url, "model": self.model}
+
+
+def create_llm_backend(backend: str) -> LLMBackend:
+    """Create the model backend selected in settings"""
+    if backend == "openai":
+        return OpenAICompatibleBackend(settings.LLM_BASE_URL, settings.LLM_API_KEY, settings.LLM_MODEL)
+    if backend == "echo":
+        return EchoBackend()
+    raise ValueError(f"Unknown LLM backend: {backend}")
+
+
+llm_backend = create_llm_backend(settings.LLM_BACKEND)
@@ -0,0 +1,53 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; there the locks only serialise threads of one server process
+    fcntl = None
+
+_thread_locks: Dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive advisory lock on `path`, shared by every server process
+
+    Blocks until the lock is free, so call it off the event loop. The lock
+    file is created if missing and left in place afterwards.
+    """
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(path, threading.Lock())
+        with lock:
+            yield
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        # flock locks belong to the open file, so threads of one process exclude each other too
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def try_lock(fd: int) -> bool:
+    """Take an exclusive advisory lock on an open file without waiting, returning False if it is held
+
+    The lock is released when the descriptor is closed.
+    """
+    if fcntl is None:
+        # Only used next to os.pwrite, which Windows lacks as well
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
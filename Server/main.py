@@ -1,12 +1,91 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
+import importlib
+import logging
+import os
+import time
 import uvicorn
 
 from config import settings
 from routes import auth, uploads, chat
-from auth import init_dummy_users
+from auth import init_dummy_users, get_password_pool_stats, get_pwd_context, password_executor
+from extraction import shutdown_extraction_executor
+from ingestion import document_indexes, vector_indexes
+from ingestion_queue import ingestion_queue
+from llm import llm_backend
+from metadata_store import metadata_store
+from text_cache import text_cache
+from answer_cache import answer_cache
+from token_cache import token_cache
+from metrics import Gauge, registry
+from rate_limit import RateLimitMiddleware
+from revocation import revocation_store
+from chat_store import chat_history_store
+
+logger = logging.getLogger(__name__)
+
+# Progress of the startup warm-up, reported by /health
+warmup_state = {"done": False, "files": 0, "seconds": None}
+
+
+def preload_modules() -> None:
+    """Import the libraries deferred at startup (JWT, bcrypt, numpy)"""
+    importlib.import_module("jose.jwt")
+    get_pwd_context()
+    if settings.RETRIEVAL_MODE != "bm25":
+        importlib.import_module("vector_index")
+
+
+def load_cached_texts(limit: int) -> int:
+    """Pull the extracted text of the most recent uploads into the memory tier, returning how many were found
+
+    Only reads what ingestion already wrote to the disk tier: parsing and
+    indexing are left to the shared ingestion queue, so starting N workers
+    does not repeat that work N times.
+    """
+    loaded = 0
+    content_hashes = {metadata.content_hash for metadata in metadata_store.list_recent_files(limit) if metadata.content_hash}
+    for content_hash in content_hashes:
+        if text_cache.get(content_hash) is not None:
+            loaded += 1
+    return loaded
+
+
+async def warm_up() -> None:
+    """Load deferred modules and the cached text of the most recent uploads"""
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(preload_modules)
+        warmup_state["files"] = await asyncio.to_thread(load_cached_texts, settings.WARMUP_MAX_FILES)
+    except Exception as e:
+        # Everything warmed here is also loaded on first use
+        logger.warning("Startup warm-up failed: %s", e)
+    warmup_state["done"] = True
+    warmup_state["seconds"] = round(time.perf_counter() - started, 3)
+
+
+def cache_hit_ratios():
+    """Hit ratio of each cache since startup"""
+    for name, stats in (("text", text_cache.stats()), ("token", token_cache.stats()), ("answer", answer_cache.stats())):
+        hits = stats["hits"] + stats.get("disk_hits", 0)
+        lookups = hits + stats["misses"]
+        yield (name,), hits / lookups if lookups else 0.0
+
+
+registry.register(Gauge(
+    "password_pool_tasks", "Password hashing calls waiting for or running on the bcrypt pool", ("state",),
+    lambda: [((state,), value) for state, value in get_password_pool_stats().items() if state in ("waiting", "running")]
+))
+registry.register(Gauge(
+    "ingestion_jobs", "Ingestion jobs by state", ("state",),
+    lambda: [((state,), count) for state, count in ingestion_queue.stats().items() if state not in ("workers", "max_queued")]
+))
+registry.register(Gauge(
+    "cache_hit_ratio", "Fraction of lookups served from cache", ("cache",), cache_hit_ratios
+))
 
 
 @asynccontextmanager
@@ -15,16 +94,43 @@ async def lifespan(app: FastAPI):
     # Startup
     print("🚀 Starting PDF Chat API...")
     
+    # Ensure upload directory exists
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    
     # Initialize dummy users for testing
     init_dummy_users()
     print("👥 Dummy users initialized")
     print("   - Username: testuser, Password: testpass123")
     print("   - Username: admin, Password: admin123")
     
+    # Resume ingestion jobs left over from the previous run
+    ingestion_queue.start()
+    
+    # Drop revoked tokens once they have expired, off the request path
+    app.state.revocation_purge_task = asyncio.create_task(revocation_store.purge_periodically())
+    
+    # Open this worker's pooled connection to the model backend
+    await llm_backend.start()
+    
+    if settings.FAST_STARTUP:
+        # Start serving right away; the task runs once the server is accepting requests
+        app.state.warmup_task = asyncio.create_task(warm_up())
+    else:
+        app.state.warmup_task = None
+        await warm_up()
+    
     yield
     
     # Shutdown
     print("🛑 Shutting down PDF Chat API...")
+    if app.state.warmup_task is not None:
+        app.state.warmup_task.cancel()
+    app.state.revocation_purge_task.cancel()
+    await ingestion_queue.stop()
+    await llm_backend.close()
+    shutdown_extraction_executor()
+    chat_history_store.close()
+    password_executor.shutdown(wait=False)
 
 
 # Create FastAPI application
@@ -37,13 +143,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Add rate limiting middleware (inside CORS, so 429s carry CORS headers)
+if settings.RATE_LIMIT_ENABLED:
+    app.add_middleware(RateLimitMiddleware)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["GET", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Location", "Upload-Offset", "Retry-After"],
 )
 
 
@@ -57,7 +168,8 @@ async def http_exception_handler(request: Request, exc: HTTPException):
             "success": False,
             "error": exc.detail,
             "status_code": exc.status_code
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
 
@@ -89,17 +201,28 @@ async def root():
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Detailed health check"""
-    import os
-    
     return {
         "status": "healthy",
         "version": settings.VERSION,
         "upload_dir_exists": os.path.exists(settings.UPLOAD_DIR),
         "upload_dir_writable": os.access(settings.UPLOAD_DIR, os.W_OK),
+        "text_cache": text_cache.stats(),
+        "index_cache": {"bm25": document_indexes.stats(), "vectors": vector_indexes.stats()},
+        "answer_cache": answer_cache.stats(),
+        "password_pool": get_password_pool_stats(),
+        "warmup": warmup_state,
+        "ingestion_queue": await asyncio.to_thread(ingestion_queue.stats),
+        "llm": llm_backend.stats(),
         "environment": "development" if settings.SECRET_KEY == "fallback-secret-key-change-in-production" else "production"
     }
 
 
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker process"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 # Include routers
 app.include_router(auth.router, prefix=settings.API_V1_PREFIX)
 app.include_router(uploads.router, prefix=settings.API_V1_PREFIX)
@@ -0,0 +1,448 @@
+import base64
+import json
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+from db import LazyConnection
+from models import PDFMetadata
+
+# Key of the all-users row in the maintained upload counters
+ALL_USERS = "*"
+
+# Number of files in a user's "recent files"
+RECENT_FILES_COUNT = 5
+
+# Position in a user's listing: (upload_time, file_id) of the last file returned
+FileCursor = Tuple[datetime, str]
+
+
+def encode_file_cursor(metadata: PDFMetadata) -> str:
+    """Encode the position after a file as an opaque cursor"""
+    raw = json.dumps([metadata.upload_time.isoformat(timespec="microseconds"), metadata.file_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_file_cursor(cursor: str) -> FileCursor:
+    """Decode an opaque cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        upload_time, file_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(upload_time), str(file_id)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+
+
+class MetadataStore:
+    """Interface for PDF metadata backends"""
+
+    def add(self, metadata: PDFMetadata) -> None:
+        """Store metadata and take a reference on its content blob"""
+        raise NotImplementedError
+
+    def add_many(self, metadata_list: List[PDFMetadata]) -> None:
+        """Store several files' metadata atomically"""
+        raise NotImplementedError
+
+    def get(self, file_id: str) -> Optional[PDFMetadata]:
+        raise NotImplementedError
+
+    def delete(self, file_id: str) -> bool:
+        """Delete metadata and drop its reference on the content blob"""
+        raise NotImplementedError
+
+    def list_user_files(self, user_id: str, limit: Optional[int] = None, after: Optional[FileCursor] = None) -> List[PDFMetadata]:
+        """Get a user's files, newest first, starting after the given cursor position"""
+        raise NotImplementedError
+
+    def list_recent_files(self, limit: int) -> List[PDFMetadata]:
+        """Get the most recently uploaded files across all users"""
+        raise NotImplementedError
+
+    def user_totals(self, user_id: str) -> Tuple[int, int]:
+        """Get (file count, total bytes) for a user"""
+        raise NotImplementedError
+
+    def totals(self) -> Tuple[int, int]:
+        """Get (file count, total bytes) across all users"""
+        raise NotImplementedError
+
+    def recent_user_files(self, user_id: str) -> List[PDFMetadata]:
+        """Get a user's RECENT_FILES_COUNT most recent files"""
+        raise NotImplementedError
+
+    def rebuild_stats(self) -> int:
+        """Recompute the maintained counters from the stored files, returning how many had drifted"""
+        raise NotImplementedError
+
+    def blob_refcount(self, content_hash: str) -> int:
+        """Get the number of files sharing the blob with the given content hash"""
+        raise NotImplementedError
+
+
+class InMemoryMetadataStore(MetadataStore):
+    """Process-local metadata store (data is lost on restart)
+
+    Uploads and deletes reach it from worker threads, so every method holds
+    one lock; refcounts and counters change together with the files.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, PDFMetadata] = {}
+        self._refcounts: Dict[str, int] = {}
+        # [file count, total bytes] per user and for ALL_USERS
+        self._stats: Dict[str, List[int]] = {}
+        # Newest-first ring of each user's most recent files
+        self._recent: Dict[str, List[PDFMetadata]] = {}
+        self._lock = threading.Lock()
+
+    def _bump_stats(self, user_id: str, count: int, size: int) -> None:
+        for key in (user_id, ALL_USERS):
+            stats = self._stats.setdefault(key, [0, 0])
+            stats[0] += count
+            stats[1] += size
+
+    def _add(self, metadata: PDFMetadata) -> None:
+        """Add a file (lock held)"""
+        self._files[metadata.file_id] = metadata
+        if metadata.content_hash:
+            self._refcounts[metadata.content_hash] = self._refcounts.get(metadata.content_hash, 0) + 1
+        self._bump_stats(metadata.user_id, 1, metadata.file_size)
+        ring = self._recent.get(metadata.user_id)
+        if ring is not None:
+            ring.append(metadata)
+            ring.sort(key=lambda x: (x.upload_time, x.file_id), reverse=True)
+            del ring[RECENT_FILES_COUNT:]
+
+    def add(self, metadata: PDFMetadata) -> None:
+        with self._lock:
+            self._add(metadata)
+
+    def add_many(self, metadata_list: List[PDFMetadata]) -> None:
+        with self._lock:
+            for metadata in metadata_list:
+                self._add(metadata)
+
+    def get(self, file_id: str) -> Optional[PDFMetadata]:
+        with self._lock:
+            return self._files.get(file_id)
+
+    def delete(self, file_id: str) -> bool:
+        with self._lock:
+            metadata = self._files.pop(file_id, None)
+            if metadata is None:
+                return False
+            if metadata.content_hash:
+                remaining = self._refcounts.get(metadata.content_hash, 1) - 1
+                if remaining > 0:
+                    self._refcounts[metadata.content_hash] = remaining
+                else:
+                    self._refcounts.pop(metadata.content_hash, None)
+            self._bump_stats(metadata.user_id, -1, -metadata.file_size)
+            ring = self._recent.get(metadata.user_id)
+            if ring is not None and any(recent.file_id == file_id for recent in ring):
+                # Refilled from the full list on the next read
+                del self._recent[metadata.user_id]
+        return True
+
+    def _list_user_files(self, user_id: str, limit: Optional[int] = None, after: Optional[FileCursor] = None) -> List[PDFMetadata]:
+        """List a user's files newest first (lock held)"""
+        user_files = [
+            metadata for metadata in self._files.values()
+            if metadata.user_id == user_id and (after is None or (metadata.upload_time, metadata.file_id) < after)
+        ]
+        user_files.sort(key=lambda x: (x.upload_time, x.file_id), reverse=True)
+        return user_files[:limit]
+
+    def list_user_files(self, user_id: str, limit: Optional[int] = None, after: Optional[FileCursor] = None) -> List[PDFMetadata]:
+        with self._lock:
+            return self._list_user_files(user_id, limit, after)
+
+    def list_recent_files(self, limit: int) -> List[PDFMetadata]:
+        with self._lock:
+            return sorted(self._files.values(), key=lambda x: (x.upload_time, x.file_id), reverse=True)[:limit]
+
+    def user_totals(self, user_id: str) -> Tuple[int, int]:
+        with self._lock:
+            count, size = self._stats.get(user_id, (0, 0))
+        return count, size
+
+    def totals(self) -> Tuple[int, int]:
+        with self._lock:
+            count, size = self._stats.get(ALL_USERS, (0, 0))
+        return count, size
+
+    def recent_user_files(self, user_id: str) -> List[PDFMetadata]:
+        with self._lock:
+            ring = self._recent.get(user_id)
+            if ring is None:
+                ring = self._recent[user_id] = self._list_user_files(user_id, RECENT_FILES_COUNT)
+            return list(ring)
+
+    def rebuild_stats(self) -> int:
+        with self._lock:
+            actual: Dict[str, List[int]] = {}
+            for metadata in self._files.values():
+                for key in (metadata.user_id, ALL_USERS):
+                    stats = actual.setdefault(key, [0, 0])
+                    stats[0] += 1
+                    stats[1] += metadata.file_size
+            drifted = sum(
+                1 for key in actual.keys() | self._stats.keys()
+                if actual.get(key, [0, 0]) != self._stats.get(key, [0, 0])
+            )
+            self._stats = actual
+            self._recent.clear()
+        return drifted
+
+    def blob_refcount(self, content_hash: str) -> int:
+        with self._lock:
+            return self._refcounts.get(content_hash, 0)
+
+
+class SQLiteMetadataStore(MetadataStore):
+    """Durable metadata store with a (user_id, upload_time DESC) index"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS pdf_files (
+        file_id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        original_filename TEXT NOT NULL,
+        file_size INTEGER NOT NULL,
+        content_type TEXT NOT NULL,
+        upload_time TEXT NOT NULL,
+        user_id TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        content_hash TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_pdf_files_user_upload_time
+        ON pdf_files (user_id, upload_time DESC, file_id DESC);
+    CREATE INDEX IF NOT EXISTS idx_pdf_files_content_hash
+        ON pdf_files (content_hash);
+    CREATE TABLE IF NOT EXISTS blobs (
+        content_hash TEXT PRIMARY KEY,
+        refcount INTEGER NOT NULL,
+        file_size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS upload_stats (
+        user_id TEXT PRIMARY KEY,
+        file_count INTEGER NOT NULL,
+        total_bytes INTEGER NOT NULL
+    );
+    """
+
+    COLUMNS = (
+        "file_id, filename, original_filename, file_size, content_type, "
+        "upload_time, user_id, file_path, content_hash"
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = LazyConnection(path, self._setup)
+        # One connection shared by the event loop and worker threads
+        self._lock = threading.Lock()
+
+    def _setup(self, conn) -> None:
+        conn.executescript(self.SCHEMA)
+        # Databases created before the counters existed start with an empty table
+        if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM upload_stats)").fetchone()[0]:
+            self._rebuild_stats(conn)
+
+    @staticmethod
+    def _to_row(metadata: PDFMetadata) -> tuple:
+        return (
+            metadata.file_id,
+            metadata.filename,
+            metadata.original_filename,
+            metadata.file_size,
+            metadata.content_type,
+            # Fixed-width timestamps so string order matches time order
+            metadata.upload_time.isoformat(timespec="microseconds"),
+            metadata.user_id,
+            metadata.file_path,
+            metadata.content_hash,
+        )
+
+    @staticmethod
+    def _from_row(row) -> PDFMetadata:
+        # Rows were validated on the way in, so skip validating them again
+        return PDFMetadata.model_construct(
+            file_id=row["file_id"],
+            filename=row["filename"],
+            original_filename=row["original_filename"],
+            file_size=row["file_size"],
+            content_type=row["content_type"],
+            upload_time=datetime.fromisoformat(row["upload_time"]),
+            user_id=row["user_id"],
+            file_path=row["file_path"],
+            content_hash=row["content_hash"]
+        )
+
+    def _bump_stats(self, deltas: Dict[str, List[int]]) -> None:
+        """Apply (count, bytes) deltas per user, and their sum to ALL_USERS, inside the caller's transaction"""
+        total = [sum(delta[0] for delta in deltas.values()), sum(delta[1] for delta in deltas.values())]
+        for user_id, (count, size) in list(deltas.items()) + [(ALL_USERS, total)]:
+            self._conn.execute(
+                "INSERT INTO upload_stats (user_id, file_count, total_bytes) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_id) DO UPDATE SET "
+                "file_count = file_count + excluded.file_count, total_bytes = total_bytes + excluded.total_bytes",
+                (user_id, count, size)
+            )
+
+    def add(self, metadata: PDFMetadata) -> None:
+        self.add_many([metadata])
+
+    def add_many(self, metadata_list: List[PDFMetadata]) -> None:
+        if not metadata_list:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for metadata in metadata_list:
+                    self._conn.execute(
+                        f"INSERT INTO pdf_files ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        self._to_row(metadata)
+                    )
+                    if metadata.content_hash:
+                        self._conn.execute(
+                            "INSERT INTO blobs (content_hash, refcount, file_size) VALUES (?, 1, ?) "
+                            "ON CONFLICT (content_hash) DO UPDATE SET refcount = refcount + 1",
+                            (metadata.content_hash, metadata.file_size)
+                        )
+                
+                deltas: Dict[str, List[int]] = {}
+                for metadata in metadata_list:
+                    delta = deltas.setdefault(metadata.user_id, [0, 0])
+                    delta[0] += 1
+                    delta[1] += metadata.file_size
+                self._bump_stats(deltas)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, file_id: str) -> Optional[PDFMetadata]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM pdf_files WHERE file_id = ?", (file_id,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def delete(self, file_id: str) -> bool:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "DELETE FROM pdf_files WHERE file_id = ? RETURNING content_hash, user_id, file_size", (file_id,)
+                ).fetchone()
+                if row:
+                    self._bump_stats({row["user_id"]: [-1, -row["file_size"]]})
+                if row and row["content_hash"]:
+                    self._conn.execute(
+                        "UPDATE blobs SET refcount = refcount - 1 WHERE content_hash = ?", (row["content_hash"],)
+                    )
+                    self._conn.execute(
+                        "DELETE FROM blobs WHERE content_hash = ? AND refcount <= 0", (row["content_hash"],)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return row is not None
+
+    def list_user_files(self, user_id: str, limit: Optional[int] = None, after: Optional[FileCursor] = None) -> List[PDFMetadata]:
+        limit = limit if limit is not None else -1
+        with self._lock:
+            if after is None:
+                rows = self._conn.execute(
+                    f"SELECT {self.COLUMNS} FROM pdf_files WHERE user_id = ? "
+                    f"ORDER BY upload_time DESC, file_id DESC LIMIT ?",
+                    (user_id, limit)
+                ).fetchall()
+            else:
+                # Keyset seek on the (user_id, upload_time, file_id) index; cost does not grow with depth
+                rows = self._conn.execute(
+                    f"SELECT {self.COLUMNS} FROM pdf_files WHERE user_id = ? AND (upload_time, file_id) < (?, ?) "
+                    f"ORDER BY upload_time DESC, file_id DESC LIMIT ?",
+                    (user_id, after[0].isoformat(timespec="microseconds"), after[1], limit)
+                ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def list_recent_files(self, limit: int) -> List[PDFMetadata]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM pdf_files ORDER BY upload_time DESC, file_id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def user_totals(self, user_id: str) -> Tuple[int, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_count, total_bytes FROM upload_stats WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def totals(self) -> Tuple[int, int]:
+        return self.user_totals(ALL_USERS)
+
+    def recent_user_files(self, user_id: str) -> List[PDFMetadata]:
+        # A bounded seek on the (user_id, upload_time DESC) index already serves as the ring
+        return self.list_user_files(user_id, RECENT_FILES_COUNT)
+
+    def rebuild_stats(self) -> int:
+        with self._lock:
+            return self._rebuild_stats(self._conn)
+
+    @staticmethod
+    def _rebuild_stats(conn) -> int:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            actual = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute(
+                    "SELECT user_id, COUNT(*), SUM(file_size) FROM pdf_files GROUP BY user_id"
+                )
+            }
+            actual[ALL_USERS] = (
+                sum(count for count, _ in actual.values()),
+                sum(size for _, size in actual.values())
+            )
+            stored = {
+                row[0]: (row[1], row[2])
+                for row in conn.execute("SELECT user_id, file_count, total_bytes FROM upload_stats")
+            }
+            drifted = sum(
+                1 for user_id in actual.keys() | stored.keys()
+                if actual.get(user_id, (0, 0)) != stored.get(user_id, (0, 0))
+            )
+            conn.execute("DELETE FROM upload_stats")
+            conn.executemany(
+                "INSERT INTO upload_stats (user_id, file_count, total_bytes) VALUES (?, ?, ?)",
+                [(user_id, count, size) for user_id, (count, size) in actual.items()]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return drifted
+
+    def blob_refcount(self, content_hash: str) -> int:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT refcount FROM blobs WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+        return row[0] if row else 0
+
+
+def create_metadata_store(backend: str) -> MetadataStore:
+    """Create the metadata backend selected in settings"""
+    if backend == "sqlite":
+        return SQLiteMetadataStore(settings.METADATA_DB_PATH)
+    if backend == "memory":
+        return InMemoryMetadataStore()
+    raise ValueError(f"Unknown metadata backend: {backend}")
+
+
+metadata_store = create_metadata_store(settings.METADATA_BACKEND)
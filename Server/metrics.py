@@ -0,0 +1,176 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+
+# Latency buckets in seconds, from cached-token checks up to slow uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Throughput buckets in bytes per second (64KB/s to 1GB/s)
+THROUGHPUT_BUCKETS = tuple(float(2 ** power) for power in range(16, 31, 2))
+
+# A gauge callback returns (label values, value) pairs, evaluated at scrape time
+GaugeCallback = Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]
+
+
+def format_labels(labelnames: Tuple[str, ...], labelvalues: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set"""
+    pairs = [
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in zip(labelnames, labelvalues)
+    ]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1.0) -> None:
+        self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in self._values.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram with labels
+
+    Each series is a flat list of per-bucket counts followed by the sum, so an
+    observation is a dict lookup, a bisect and two additions.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        series = self._series.get(labelvalues)
+        if series is None:
+            # One slot per bucket, one for +Inf, one for the sum
+            series = self._series[labelvalues] = [0.0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in self._series.items():
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose values are read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...], callback: GaugeCallback):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labelvalues, value in self.callback():
+            lines.append(f"{self.name}{format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class MetricsRegistry:
+    """Per-process metrics, rendered in the Prometheus text format
+
+    Metrics are only updated from the event loop thread, so recording needs no
+    locks. Each worker process keeps its own registry and is scraped separately.
+    """
+
+    def __init__(self):
+        self._metrics: list = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+request_count = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+request_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time until the route returned its response", ("method", "route")
+))
+upload_bytes = registry.register(Counter(
+    "upload_bytes_total", "Bytes received in uploads", ("kind",)
+))
+upload_throughput = registry.register(Histogram(
+    "upload_throughput_bytes_per_second", "Per-upload write throughput", ("kind",), THROUGHPUT_BUCKETS
+))
+stage_latency = registry.register(Histogram(
+    "ingestion_stage_duration_seconds", "Time spent in extraction, indexing and retrieval stages", ("stage",)
+))
+rate_limit_rejections = registry.register(Counter(
+    "rate_limit_rejections_total", "Requests answered with 429 by the rate limiter", ("route_class",)
+))
+
+
+def record_upload(kind: str, nbytes: int, seconds: float) -> None:
+    """Count uploaded bytes and the throughput they were written at"""
+    upload_bytes.inc(kind, amount=nbytes)
+    if seconds > 0:
+        upload_throughput.observe(nbytes / seconds, kind)
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records request count and latency under its path template"""
+
+    def get_route_handler(self) -> Callable[[Request], Response]:
+        handler = super().get_route_handler()
+        method = next(iter(self.methods)) if len(self.methods) == 1 else ",".join(sorted(self.methods))
+        route = self.path_format
+
+        async def timed_handler(request: Request) -> Response:
+            started = time.perf_counter()
+            status_code = 500
+            try:
+                response = await handler(request)
+                status_code = response.status_code
+                return response
+            except HTTPException as e:
+                status_code = e.status_code
+                raise
+            except RequestValidationError:
+                status_code = 422
+                raise
+            finally:
+                request_latency.observe(time.perf_counter() - started, method, route)
+                request_count.inc(method, route, str(status_code))
+
+        return timed_handler
@@ -53,6 +53,8 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     username: Optional[str] = None
     user_id: Optional[str] = None
+    jti: Optional[str] = None
+    exp: Optional[float] = None
 
 
 class RefreshTokenRequest(BaseModel):
@@ -70,9 +72,71 @@ class PDFUploadResponse(BaseModel):
     user_id: str
 
 
+class BatchUploadResult(BaseModel):
+    filename: Optional[str] = None
+    success: bool
+    file: Optional[PDFUploadResponse] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResponse(BaseModel):
+    results: List[BatchUploadResult]
+    succeeded: int
+    failed: int
+
+
+class PageText(BaseModel):
+    page: int
+    text: str
+
+
+class PageRangeResponse(BaseModel):
+    file_id: str
+    page_count: int
+    start: int
+    end: int
+    pages: List[PageText]
+
+
+class IngestionStatus(BaseModel):
+    file_id: str
+    status: str  # queued, processing, ready or failed
+    progress: float
+    error: Optional[str] = None
+    queue_position: Optional[int] = None
+    updated_at: datetime
+
+
+class ResumableUploadCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    file_size: int = Field(..., ge=1)
+    content_type: str = "application/pdf"
+
+
+class ResumableUploadStatus(BaseModel):
+    upload_id: str
+    filename: str
+    file_size: int
+    offset: int
+    progress: float
+    expires_at: datetime
+
+
+class PDFListItem(BaseModel):
+    """A listed file; only the fields selected with `fields` are sent (all of them by default)"""
+    file_id: Optional[str] = None
+    filename: Optional[str] = None
+    original_filename: Optional[str] = None
+    file_size: Optional[int] = None
+    content_type: Optional[str] = None
+    upload_time: Optional[datetime] = None
+    user_id: Optional[str] = None
+
+
 class PDFListResponse(BaseModel):
-    files: List[PDFUploadResponse]
-    total_count: int
+    files: List[PDFListItem]
+    total_count: int = Field(..., description="Number of files the user has in total, not the number on this page")
+    next_cursor: Optional[str] = None
 
 
 class PDFMetadata(BaseModel):
@@ -84,6 +148,14 @@ class PDFMetadata(BaseModel):
     upload_time: datetime
     user_id: str
     file_path: str  # Internal use only
+    content_hash: Optional[str] = None  # SHA-256 of the file bytes
+
+
+class RetrievedChunk(BaseModel):
+    chunk_id: int
+    page: int
+    score: float
+    text: str
 
 
 # API Response Models
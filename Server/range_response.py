@@ -0,0 +1,260 @@
+import calendar
+import os
+import uuid
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+from typing import List, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# More ranges than this is more likely abuse than a PDF viewer; serve the whole file instead
+MAX_RANGES = 32
+
+ByteRange = Tuple[int, int]  # inclusive (start, end)
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date"""
+    return formatdate(calendar.timegm(value.utctimetuple()), usegmt=True)
+
+
+def parse_range_header(header: str, file_size: int) -> Optional[List[ByteRange]]:
+    """Parse a Range header into sorted, merged byte ranges
+
+    Returns None when the header is malformed or not a bytes range (the whole
+    file is served), and raises RangeNotSatisfiable when no range overlaps it.
+    """
+    if not header.startswith("bytes="):
+        return None
+    
+    ranges: List[ByteRange] = []
+    try:
+        for spec in header[len("bytes="):].split(","):
+            start_text, end_text = spec.strip().split("-", 1)
+            if not start_text:
+                # Suffix range: the last N bytes
+                length = int(end_text)
+                if length <= 0:
+                    continue
+                ranges.append((max(file_size - length, 0), file_size - 1))
+                continue
+            
+            start = int(start_text)
+            if start >= file_size:
+                continue
+            end = int(end_text) if end_text else file_size - 1
+            if start > end:
+                return None
+            ranges.append((start, min(end, file_size - 1)))
+    except ValueError:
+        return None
+    
+    if not ranges or file_size == 0:
+        raise RangeNotSatisfiable()
+    
+    # Merge overlapping or adjacent ranges
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    
+    return merged if len(merged) <= MAX_RANGES else None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match / If-Range list against our ETag"""
+    if header.strip() == "*":
+        return True
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+def _not_modified_since(header: str, last_modified: datetime) -> bool:
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # HTTP dates have second precision
+    return last_modified.replace(microsecond=0) <= since
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since (RFC 9110 precedence)"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        return _not_modified_since(if_modified_since, last_modified)
+    return False
+
+
+def _if_range_matches(request: Request, etag: str, last_modified: datetime) -> bool:
+    if_range = request.headers.get("if-range")
+    if if_range is None:
+        return True
+    if if_range.strip().startswith(('"', "W/")):
+        # If-Range requires a strong match
+        return if_range.strip() == etag
+    return _not_modified_since(if_range, last_modified)
+
+
+class RangeFileResponse(Response):
+    """Serve a whole file, one byte range or several ranges as multipart/byteranges
+
+    Bodies are sent with the ASGI zero-copy extension (sendfile) when the
+    server advertises it, otherwise read in chunks off the event loop.
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        file_size: int,
+        ranges: Optional[List[ByteRange]],
+        media_type: str,
+        headers: dict,
+        send_header_only: bool = False
+    ):
+        self.path = path
+        self.file_size = file_size
+        self.ranges = ranges or ([(0, file_size - 1)] if file_size else [])
+        self.send_header_only = send_header_only
+        self.background = None
+        self.boundary = None
+        self.part_headers: List[bytes] = []
+        
+        if ranges is None:
+            self.status_code = 200
+            self.media_type = media_type
+            content_length = file_size
+        elif len(ranges) == 1:
+            self.status_code = 206
+            self.media_type = media_type
+            start, end = ranges[0]
+            headers["content-range"] = f"bytes {start}-{end}/{file_size}"
+            content_length = end - start + 1
+        else:
+            self.status_code = 206
+            self.boundary = uuid.uuid4().hex
+            self.media_type = f"multipart/byteranges; boundary={self.boundary}"
+            for index, (start, end) in enumerate(ranges):
+                self.part_headers.append((
+                    ("\r\n" if index else "")
+                    + f"--{self.boundary}\r\n"
+                    + f"Content-Type: {media_type}\r\n"
+                    + f"Content-Range: bytes {start}-{end}/{file_size}\r\n\r\n"
+                ).encode("latin-1"))
+            self.closing = f"\r\n--{self.boundary}--\r\n".encode("latin-1")
+            content_length = sum(len(part) for part in self.part_headers) + len(self.closing) + sum(
+                end - start + 1 for start, end in ranges
+            )
+        
+        self.init_headers(headers)
+        self.headers["content-length"] = str(content_length)
+
+    async def _send_range(self, send: Send, file, start: int, end: int, zero_copy: bool) -> None:
+        if zero_copy:
+            await send({
+                "type": "http.response.zerocopysend",
+                "file": file,
+                "offset": start,
+                "count": end - start + 1,
+                "more_body": True,
+            })
+            return
+        
+        position = start
+        while position <= end:
+            length = min(self.chunk_size, end - position + 1)
+            chunk = await anyio.to_thread.run_sync(os.pread, file.fileno(), length, position)
+            if not chunk:
+                break
+            position += len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": self.status_code,
+            "headers": self.raw_headers,
+        })
+        if self.send_header_only:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        
+        zero_copy = "http.response.zerocopysend" in scope.get("extensions", {})
+        file = await anyio.to_thread.run_sync(open, self.path, "rb")
+        try:
+            for index, (start, end) in enumerate(self.ranges):
+                if self.boundary:
+                    await send({"type": "http.response.body", "body": self.part_headers[index], "more_body": True})
+                await self._send_range(send, file, start, end, zero_copy)
+            closing = self.closing if self.boundary else b""
+            await send({"type": "http.response.body", "body": closing, "more_body": False})
+        finally:
+            file.close()
+
+
+def file_response(
+    request: Request,
+    path: str,
+    file_size: int,
+    etag: str,
+    last_modified: datetime,
+    filename: str,
+    media_type: str
+) -> Response:
+    """Build a conditional, range-aware response for a stored file"""
+    headers = {
+        "etag": etag,
+        "last-modified": http_date(last_modified),
+        "accept-ranges": "bytes",
+        # Always revalidate; a matching ETag turns the revalidation into a 304
+        "cache-control": "private, no-cache",
+    }
+    
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    quoted = quote(filename)
+    if quoted != filename:
+        headers["content-disposition"] = f"attachment; filename*=utf-8''{quoted}"
+    else:
+        headers["content-disposition"] = f'attachment; filename="{filename}"'
+    
+    ranges = None
+    range_header = request.headers.get("range")
+    if range_header and _if_range_matches(request, etag, last_modified):
+        try:
+            ranges = parse_range_header(range_header, file_size)
+        except RangeNotSatisfiable:
+            return Response(
+                status_code=416,
+                headers={**headers, "content-range": f"bytes */{file_size}"}
+            )
+    
+    return RangeFileResponse(
+        path,
+        file_size,
+        ranges,
+        media_type,
+        headers,
+        send_header_only=request.method == "HEAD"
+    )
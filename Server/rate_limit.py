@@ -0,0 +1,227 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from auth import decode_token
+from config import settings
+from db import LazyConnection
+from metrics import rate_limit_rejections
+from token_cache import token_cache
+
+# Seconds between sweeps of buckets that have refilled completely
+PURGE_INTERVAL_SECONDS = 60
+
+
+class BucketStore:
+    """Interface for token bucket backends
+
+    A bucket is (tokens, updated_at). Refill is lazy: a check adds the tokens
+    earned since `updated_at` and then tries to take one, so every check is a
+    single O(1) read-modify-write no matter how long the bucket sat idle.
+    """
+
+    # Whether take() and purge() can wait on I/O, so callers on the event loop run them in a thread
+    blocking = False
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        """Take a token, returning 0 if one was available or else the seconds until one will be"""
+        raise NotImplementedError
+
+    def purge(self, idle_before: float) -> int:
+        """Delete buckets last touched before `idle_before` (they have refilled), returning how many"""
+        raise NotImplementedError
+
+
+class InMemoryBucketStore(BucketStore):
+    """Per-process buckets; each server worker enforces its own limits"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            self._buckets[key] = (tokens - 1, now)
+            return 0.0
+
+    def purge(self, idle_before: float) -> int:
+        with self._lock:
+            idle = [key for key, (_, updated_at) in self._buckets.items() if updated_at < idle_before]
+            for key in idle:
+                del self._buckets[key]
+        return len(idle)
+
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in SQLite, shared by every server process
+
+    The refill and the take happen in one UPSERT, so concurrent checks from
+    different workers can't both spend the last token.
+    """
+
+    blocking = True
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+        bucket_key TEXT PRIMARY KEY,
+        tokens REAL NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_rate_limit_buckets_updated ON rate_limit_buckets (updated_at);
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = LazyConnection(path, lambda conn: conn.executescript(self.SCHEMA))
+        # One connection shared by the event loop and worker threads
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: int, rate: float, now: float) -> float:
+        with self._lock:
+            # The update only happens when the refilled bucket holds a whole token
+            row = self._conn.execute(
+                "INSERT INTO rate_limit_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT (bucket_key) DO UPDATE SET "
+                "tokens = MIN(?, rate_limit_buckets.tokens + (excluded.updated_at - rate_limit_buckets.updated_at) * ?) - 1, "
+                "updated_at = excluded.updated_at "
+                "WHERE MIN(?, rate_limit_buckets.tokens + (excluded.updated_at - rate_limit_buckets.updated_at) * ?) >= 1 "
+                "RETURNING tokens",
+                (key, capacity - 1, now, capacity, rate, capacity, rate)
+            ).fetchone()
+            if row is not None:
+                return 0.0
+
+            row = self._conn.execute(
+                "SELECT tokens, updated_at FROM rate_limit_buckets WHERE bucket_key = ?", (key,)
+            ).fetchone()
+        tokens = min(capacity, row["tokens"] + (now - row["updated_at"]) * rate)
+        return max(0.0, (1 - tokens) / rate)
+
+    def purge(self, idle_before: float) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "DELETE FROM rate_limit_buckets WHERE updated_at < ?", (idle_before,)
+            ).rowcount
+
+
+class RateLimiter:
+    """Token buckets per (route class, user or client IP)
+
+    Each route class allows `capacity` requests in a burst and refills at
+    `per_minute` requests per minute.
+    """
+
+    def __init__(self, store: BucketStore, limits: Dict[str, Tuple[int, int]]):
+        self.store = store
+        # A class with no capacity or refill rate is unlimited
+        self.limits = {
+            route_class: (capacity, per_minute / 60)
+            for route_class, (capacity, per_minute) in limits.items()
+            if capacity > 0 and per_minute > 0
+        }
+        # Longest time any bucket takes to refill from empty; idle longer than that, it is full
+        self.refill_seconds = max((capacity / rate for capacity, rate in self.limits.values()), default=0.0)
+        self._next_purge = 0.0
+
+    def check(self, route_class: str, client_key: str) -> float:
+        """Spend a token for the client, returning 0 if admitted or else the seconds to wait"""
+        limit = self.limits.get(route_class)
+        if limit is None:
+            return 0.0
+
+        now = time.time()
+        if now >= self._next_purge:
+            self._next_purge = now + PURGE_INTERVAL_SECONDS
+            self.store.purge(now - self.refill_seconds)
+
+        capacity, rate = limit
+        return self.store.take(f"{route_class}:{client_key}", capacity, rate, now)
+
+
+def create_rate_limiter(backend: str) -> RateLimiter:
+    """Create the rate limiter with the bucket backend and limits selected in settings"""
+    if backend == "sqlite":
+        store: BucketStore = SQLiteBucketStore(settings.RATE_LIMIT_DB_PATH)
+    elif backend == "memory":
+        store = InMemoryBucketStore()
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend}")
+
+    return RateLimiter(store, {
+        "login": (settings.RATE_LIMIT_LOGIN_CAPACITY, settings.RATE_LIMIT_LOGIN_PER_MINUTE),
+        "upload": (settings.RATE_LIMIT_UPLOAD_CAPACITY, settings.RATE_LIMIT_UPLOAD_PER_MINUTE),
+        "chat": (settings.RATE_LIMIT_CHAT_CAPACITY, settings.RATE_LIMIT_CHAT_PER_MINUTE),
+    })
+
+
+# Expensive endpoints by (method, path); everything else is not rate limited
+ROUTE_CLASSES = {
+    ("POST", f"{settings.API_V1_PREFIX}/auth/login"): "login",
+    ("POST", f"{settings.API_V1_PREFIX}/auth/register"): "login",
+    ("POST", f"{settings.API_V1_PREFIX}/uploads/pdf"): "upload",
+    ("POST", f"{settings.API_V1_PREFIX}/uploads/pdfs/batch"): "upload",
+    ("POST", f"{settings.API_V1_PREFIX}/uploads/resumable"): "upload",
+    ("POST", f"{settings.API_V1_PREFIX}/chat/message"): "chat",
+    ("POST", f"{settings.API_V1_PREFIX}/chat/message/stream"): "chat",
+}
+
+
+def client_key(scope) -> str:
+    """Identify the caller: the user ID from a valid bearer token, else the client IP"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    token_data = token_cache.get(token, "access") or decode_token(token, "access")
+                    return f"user:{token_data.user_id}"
+                except HTTPException:
+                    # Invalid tokens are rejected by the route itself; limit them by IP
+                    pass
+            break
+
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware answering 429 with Retry-After once a client's bucket for the route class is empty"""
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter if limiter is not None else create_rate_limiter(settings.RATE_LIMIT_BACKEND)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            route_class = ROUTE_CLASSES.get((scope["method"], scope["path"]))
+            if route_class is not None:
+                key = client_key(scope)
+                if self.limiter.store.blocking:
+                    # Shared buckets take a cross-process write lock; wait for it off the event loop
+                    retry_after = await asyncio.to_thread(self.limiter.check, route_class, key)
+                else:
+                    retry_after = self.limiter.check(route_class, key)
+                if retry_after > 0:
+                    rate_limit_rejections.inc(route_class)
+                    response = JSONResponse(
+                        status_code=429,
+                        content={
+                            "success": False,
+                            "error": "Too many requests, please retry later",
+                            "status_code": 429
+                        },
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        await self.app(scope, receive, send)
@@ -0,0 +1,333 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+
+from config import settings
+from models import PDFMetadata, ResumableUploadStatus
+from file_utils import register_file
+from locks import file_lock, try_lock
+from metrics import record_upload
+
+# Seconds between sweeps of abandoned upload sessions
+PURGE_INTERVAL_SECONDS = 600
+
+_next_purge = 0.0
+
+
+def _user_dir(user_id: str) -> str:
+    # Each user's uploads live in their own directory, so limits only list that user's sessions
+    return os.path.join(settings.RESUMABLE_UPLOAD_DIR, hashlib.sha256(user_id.encode("utf-8")).hexdigest()[:32])
+
+
+def _paths(upload_id: str, user_id: str):
+    base = os.path.join(_user_dir(user_id), upload_id)
+    return f"{base}.json", f"{base}.part"
+
+
+def _read_session(session_path: str) -> Optional[dict]:
+    try:
+        with open(session_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _load_session(upload_id: str, user_id: str) -> Optional[dict]:
+    # Upload IDs end up in file paths, so only accept what we generate
+    try:
+        uuid.UUID(upload_id)
+    except ValueError:
+        return None
+    
+    session_path, _ = _paths(upload_id, user_id)
+    return _read_session(session_path)
+
+
+def _save_session(session: dict) -> None:
+    session_path, _ = _paths(session["upload_id"], session["user_id"])
+    tmp_path = f"{session_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(session, f)
+    os.replace(tmp_path, session_path)
+
+
+def _remove_session(upload_id: str, user_id: str) -> None:
+    for path in _paths(upload_id, user_id):
+        # A sweep in another request may have got there first
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _to_status(session: dict) -> ResumableUploadStatus:
+    return ResumableUploadStatus(
+        upload_id=session["upload_id"],
+        filename=session["filename"],
+        file_size=session["file_size"],
+        offset=session["offset"],
+        progress=round(session["offset"] / session["file_size"], 4) if session["file_size"] else 1.0,
+        expires_at=datetime.utcfromtimestamp(session["expires_at"])
+    )
+
+
+def _not_found() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Upload not found or you don't have permission to access it"
+    )
+
+
+def get_session(upload_id: str, user_id: str) -> dict:
+    """Get an upload session owned by the user, raising 404 otherwise"""
+    session = _load_session(upload_id, user_id)
+    if not session or session["user_id"] != user_id:
+        raise _not_found()
+    if session["expires_at"] < time.time():
+        _remove_session(upload_id, user_id)
+        raise _not_found()
+    return session
+
+
+def _upload_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_423_LOCKED,
+        detail="Another request is writing to this upload. Retry once it has finished"
+    )
+
+
+def _lock_upload(upload_id: str, user_id: str, flags: int) -> int:
+    """Open the upload's part file and lock it for this request, returning the descriptor
+
+    The lock is on the file itself, so requests for the same upload exclude
+    each other across server processes; it is released when the descriptor
+    is closed.
+    """
+    _, part_path = _paths(upload_id, user_id)
+    try:
+        fd = os.open(part_path, flags)
+    except FileNotFoundError:
+        raise _not_found()
+    if not try_lock(fd):
+        os.close(fd)
+        raise _upload_busy()
+    return fd
+
+
+def _sweep_sessions(directory: str, now: float) -> Tuple[List[dict], int]:
+    """Remove expired sessions in a directory, returning the ones still open and how many were removed"""
+    sessions = []
+    removed = 0
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        session = _read_session(os.path.join(directory, name))
+        if session is None:
+            continue
+        if session["expires_at"] < now:
+            _remove_session(session["upload_id"], session["user_id"])
+            removed += 1
+        else:
+            sessions.append(session)
+    return sessions, removed
+
+
+def purge_expired_uploads() -> int:
+    """Remove abandoned upload sessions, returning how many were removed"""
+    removed = 0
+    if not os.path.isdir(settings.RESUMABLE_UPLOAD_DIR):
+        return removed
+    
+    now = time.time()
+    for entry in os.scandir(settings.RESUMABLE_UPLOAD_DIR):
+        if entry.is_dir():
+            removed += _sweep_sessions(entry.path, now)[1]
+        elif entry.name.endswith(".part") and entry.stat().st_mtime < now - settings.RESUMABLE_UPLOAD_EXPIRE_HOURS * 3600:
+            # Left by the older flat layout, which kept every user's uploads in one directory
+            for path in (entry.path, f"{entry.path[:-len('.part')]}.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+            removed += 1
+    return removed
+
+
+def _create_session(user_id: str, filename: str, file_size: int, content_type: str) -> dict:
+    """Check the user's limits, then preallocate the upload (blocking; run in a thread)"""
+    # Sweep abandoned sessions now and then rather than listing the directory on every create
+    global _next_purge
+    now = time.time()
+    if now >= _next_purge:
+        _next_purge = now + PURGE_INTERVAL_SECONDS
+        purge_expired_uploads()
+    
+    user_dir = _user_dir(user_id)
+    os.makedirs(user_dir, exist_ok=True)
+    
+    # Held across workers, so concurrent creates can't both slip under the limits
+    with file_lock(os.path.join(user_dir, ".lock")):
+        open_sessions, _ = _sweep_sessions(user_dir, now)
+        if len(open_sessions) >= settings.RESUMABLE_MAX_SESSIONS_PER_USER:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"Too many unfinished uploads. Finish or cancel one of your "
+                       f"{len(open_sessions)} open uploads first"
+            )
+        reserved = sum(session["file_size"] for session in open_sessions)
+        if reserved + file_size > settings.RESUMABLE_MAX_RESERVED_BYTES_PER_USER:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Unfinished uploads may reserve at most "
+                       f"{settings.RESUMABLE_MAX_RESERVED_BYTES_PER_USER / (1024*1024):.1f}MB per user. "
+                       f"Finish or cancel an upload first"
+            )
+        
+        session = {
+            "upload_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "filename": filename,
+            "content_type": content_type,
+            "file_size": file_size,
+            "offset": 0,
+            "expires_at": time.time() + settings.RESUMABLE_UPLOAD_EXPIRE_HOURS * 3600,
+        }
+        
+        # Reserve the full size up front so chunks are written in place at their offset
+        _, part_path = _paths(session["upload_id"], user_id)
+        with open(part_path, "wb") as f:
+            if hasattr(os, "posix_fallocate") and file_size:
+                os.posix_fallocate(f.fileno(), 0, file_size)
+            else:
+                f.truncate(file_size)
+        
+        _save_session(session)
+    return session
+
+
+async def create_upload(user_id: str, filename: str, file_size: int, content_type: str) -> ResumableUploadStatus:
+    """Start a resumable upload and preallocate its file"""
+    if content_type not in settings.ALLOWED_FILE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid file type. Only PDF files are allowed. Got: {content_type}"
+        )
+    
+    if file_size > settings.RESUMABLE_MAX_FILE_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size allowed: {settings.RESUMABLE_MAX_FILE_SIZE / (1024*1024):.1f}MB"
+        )
+    
+    # Preallocating hundreds of MB, and the occasional sweep, would stall the event loop
+    session = await asyncio.to_thread(_create_session, user_id, filename, file_size, content_type)
+    return _to_status(session)
+
+
+def get_upload_status(upload_id: str, user_id: str) -> ResumableUploadStatus:
+    """Get the progress of an upload"""
+    return _to_status(get_session(upload_id, user_id))
+
+
+async def write_chunk(upload_id: str, user_id: str, offset: int, body: AsyncIterator[bytes]) -> ResumableUploadStatus:
+    """Write a request body into the upload at the given offset
+
+    Offsets must match the bytes received so far (as in tus), so a client
+    that lost a connection asks for the status and resumes from `offset`.
+    Bytes that arrived before a dropped connection are kept.
+    """
+    # Unknown uploads are rejected before anything is opened or locked
+    get_session(upload_id, user_id)
+    
+    fd = _lock_upload(upload_id, user_id, os.O_WRONLY)
+    try:
+        # Re-read under the lock: another request may have advanced or finished the upload
+        session = get_session(upload_id, user_id)
+        if offset != session["offset"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload-Offset mismatch. Expected offset: {session['offset']}"
+            )
+        
+        started = time.perf_counter()
+        start_offset = session["offset"]
+        try:
+            async for chunk in body:
+                if not chunk:
+                    continue
+                if session["offset"] + len(chunk) > session["file_size"]:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail="Chunk extends past the declared file size"
+                    )
+                await asyncio.to_thread(os.pwrite, fd, chunk, session["offset"])
+                session["offset"] += len(chunk)
+        finally:
+            _save_session(session)
+            record_upload("resumable", session["offset"] - start_offset, time.perf_counter() - started)
+        
+        return _to_status(session)
+    finally:
+        os.close(fd)
+
+
+def _hash_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def finalize_upload(upload_id: str, user_id: str) -> PDFMetadata:
+    """Turn a completed upload into a stored file"""
+    get_session(upload_id, user_id)
+    
+    fd = _lock_upload(upload_id, user_id, os.O_RDONLY)
+    try:
+        session = get_session(upload_id, user_id)
+        if session["offset"] != session["file_size"]:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload incomplete: received {session['offset']} of {session['file_size']} bytes"
+            )
+        
+        _, part_path = _paths(upload_id, user_id)
+        with open(part_path, "rb") as f:
+            if f.read(5) != b"%PDF-":
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Uploaded file is not a PDF"
+                )
+        
+        # Chunks may come from different workers, so hash the finished file in one pass
+        content_hash = await asyncio.to_thread(_hash_file, part_path)
+        metadata = await register_file(
+            part_path,
+            content_hash,
+            session["file_size"],
+            session["filename"],
+            session["content_type"],
+            user_id
+        )
+        _remove_session(upload_id, user_id)
+        return metadata
+    finally:
+        os.close(fd)
+
+
+def cancel_upload(upload_id: str, user_id: str) -> None:
+    """Abort an upload and delete the received bytes"""
+    get_session(upload_id, user_id)
+    
+    # A PATCH still writing would save its session again after the files were removed
+    fd = _lock_upload(upload_id, user_id, os.O_RDONLY)
+    try:
+        _remove_session(upload_id, user_id)
+    finally:
+        os.close(fd)
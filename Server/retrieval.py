@@ -0,0 +1,246 @@
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from config import settings
+from text_cache import ExtractedText
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the "
+    "this to was were what when where which who why will with how do does".split()
+)
+
+# Rough cost of one vocabulary dict entry (key object, int and hash slot) on top of the term itself
+VOCABULARY_ENTRY_BYTES = 120
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords removed"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def chunk_document(extracted: ExtractedText, chunk_size: int, overlap: int) -> Tuple[List[str], array, array, array]:
+    """Split a document into overlapping word windows
+
+    Returns the chunk texts and, for each chunk, the index of its first word
+    and the (0-based) page it starts on, plus the index of the first word of
+    every page (with the total word count appended).
+    """
+    words: List[str] = []
+    word_pages = array("I")
+    page_word_offsets = array("I", [0])
+    for page_number in range(extracted.page_count):
+        page_words = extracted.page(page_number).split()
+        words.extend(page_words)
+        word_pages.extend([page_number] * len(page_words))
+        page_word_offsets.append(len(words))
+    
+    chunks: List[str] = []
+    chunk_starts = array("I")
+    chunk_pages = array("I")
+    step = max(chunk_size - overlap, 1)
+    for start in range(0, max(len(words) - overlap, 1), step):
+        window = words[start:start + chunk_size]
+        if not window:
+            break
+        chunks.append(" ".join(window))
+        chunk_starts.append(start)
+        chunk_pages.append(word_pages[start])
+    return chunks, chunk_starts, chunk_pages, page_word_offsets
+
+
+class BM25Index:
+    """Per-document BM25 inverted index over overlapping chunks
+
+    Postings are stored CSR-style in flat typed arrays: the postings of term t
+    are posting_chunks/posting_tfs[posting_offsets[t]:posting_offsets[t + 1]].
+
+    Chunk texts are not kept: a chunk is a word range of the document, and
+    chunk_text() cuts it back out of the cached page text when it is needed.
+    """
+
+    __slots__ = (
+        "chunk_size", "chunk_starts", "chunk_pages", "page_word_offsets", "vocabulary",
+        "posting_offsets", "posting_chunks", "posting_tfs", "idf", "chunk_norms", "k1", "nbytes",
+    )
+
+    def __init__(
+        self,
+        chunks: List[str],
+        chunk_starts: array,
+        chunk_pages: array,
+        page_word_offsets: array,
+        chunk_size: int,
+        k1: float = 1.5,
+        b: float = 0.75
+    ):
+        self.chunk_size = chunk_size
+        self.chunk_starts = chunk_starts
+        self.chunk_pages = chunk_pages
+        self.page_word_offsets = page_word_offsets
+        self.k1 = k1
+        
+        # Count term frequencies per chunk
+        term_postings: Dict[str, List[Tuple[int, int]]] = {}
+        chunk_lengths = array("I")
+        for chunk_id, chunk in enumerate(chunks):
+            tokens = tokenize(chunk)
+            chunk_lengths.append(len(tokens))
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                term_postings.setdefault(token, []).append((chunk_id, tf))
+        
+        # Flatten the postings into typed arrays
+        self.vocabulary: Dict[str, int] = {}
+        self.posting_offsets = array("I", [0])
+        self.posting_chunks = array("I")
+        self.posting_tfs = array("H")
+        self.idf = array("f")
+        num_chunks = len(chunks)
+        for term_id, (token, postings) in enumerate(term_postings.items()):
+            self.vocabulary[token] = term_id
+            for chunk_id, tf in postings:
+                self.posting_chunks.append(chunk_id)
+                self.posting_tfs.append(min(tf, 0xFFFF))
+            self.posting_offsets.append(len(self.posting_chunks))
+            df = len(postings)
+            self.idf.append(math.log(1 + (num_chunks - df + 0.5) / (df + 0.5)))
+        
+        # Precompute the length normalisation term of the BM25 denominator
+        avg_length = (sum(chunk_lengths) / num_chunks) if num_chunks else 0.0
+        self.chunk_norms = array("f", (
+            k1 * (1 - b + b * length / avg_length) if avg_length else k1
+            for length in chunk_lengths
+        ))
+        
+        # Approximate resident size: the typed arrays plus the vocabulary dict
+        self.nbytes = sum(
+            len(arr) * arr.itemsize
+            for arr in (
+                self.chunk_starts, self.chunk_pages, self.page_word_offsets, self.posting_offsets,
+                self.posting_chunks, self.posting_tfs, self.idf, self.chunk_norms,
+            )
+        ) + sum(VOCABULARY_ENTRY_BYTES + len(token) for token in self.vocabulary)
+
+    def chunk_text(self, extracted: ExtractedText, chunk_id: int) -> str:
+        """Rebuild the text of a chunk from the document it was built from"""
+        start = self.chunk_starts[chunk_id]
+        end = start + self.chunk_size
+        words: List[str] = []
+        page = self.chunk_pages[chunk_id]
+        while page < extracted.page_count and self.page_word_offsets[page] < end:
+            first_word = self.page_word_offsets[page]
+            words.extend(extracted.page(page).split()[max(start - first_word, 0):end - first_word])
+            page += 1
+        return " ".join(words)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Get the top-k (chunk_id, score) pairs for a query"""
+        scores: Dict[int, float] = {}
+        k1 = self.k1
+        posting_chunks = self.posting_chunks
+        posting_tfs = self.posting_tfs
+        chunk_norms = self.chunk_norms
+        for token in set(tokenize(query)):
+            term_id = self.vocabulary.get(token)
+            if term_id is None:
+                continue
+            idf = self.idf[term_id]
+            for i in range(self.posting_offsets[term_id], self.posting_offsets[term_id + 1]):
+                chunk_id = posting_chunks[i]
+                tf = posting_tfs[i]
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + chunk_norms[chunk_id])
+        
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+def build_index(extracted: ExtractedText) -> BM25Index:
+    """Chunk a document and build its BM25 index (runs inside a worker process)"""
+    chunks, chunk_starts, chunk_pages, page_word_offsets = chunk_document(
+        extracted, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP
+    )
+    return BM25Index(chunks, chunk_starts, chunk_pages, page_word_offsets, settings.CHUNK_SIZE)
+
+
+def document_chunks(extracted: ExtractedText) -> List[str]:
+    """Chunk texts of a document, in chunk_id order"""
+    return chunk_document(extracted, settings.CHUNK_SIZE, settings.CHUNK_OVERLAP)[0]
+
+
+class IndexCache:
+    """LRU of per-document indexes keyed by content hash, capped in bytes
+
+    Values only need an `nbytes` attribute. Evicted indexes are rebuilt (or
+    re-mapped) from the text cache and disk on their next use.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, object]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, entry) -> None:
+        """Store an index, evicting least recently used ones to stay under the byte cap"""
+        with self._lock:
+            self._pop(key)
+            # Indexes larger than the whole budget are used once and not kept
+            if entry.nbytes > self.max_bytes:
+                return
+            self._entries[key] = entry
+            self._size += entry.nbytes
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.nbytes
+                self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key: str) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old.nbytes
+
+    def stats(self) -> Dict[str, int]:
+        """Get size and hit/miss/eviction counters for capacity planning"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._size,
+                "max_memory_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], top_k: int, k: int = 60) -> List[Tuple[int, float]]:
+    """Merge several ranked (chunk_id, score) lists into one by reciprocal rank"""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, (chunk_id, _) in enumerate(ranking):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank + 1)
+    return heapq.nlargest(top_k, fused.items(), key=lambda item: item[1])
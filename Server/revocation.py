@@ -0,0 +1,146 @@
+import asyncio
+import hashlib
+import math
+import threading
+import time
+from typing import Dict, Optional
+
+from config import settings
+from db import LazyConnection
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationStore:
+    """Revoked token IDs (jti) in SQLite, shared by every server process
+
+    A revoked token only needs remembering until it would have expired anyway,
+    so each jti is stored with the bucket covering its `exp` and whole buckets
+    are deleted once their window has passed. Membership is a primary-key
+    lookup, optionally fronted by a per-process Bloom filter so the common
+    not-revoked case never touches the database. The filter catches up on
+    other workers' revocations whenever SQLite reports that another
+    connection has committed (`PRAGMA data_version`). Expired buckets are
+    deleted by a background task, never on a request.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        jti TEXT NOT NULL UNIQUE,
+        bucket INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_revoked_tokens_bucket ON revoked_tokens (bucket);
+    """
+
+    def __init__(self, path: str, bucket_seconds: int, use_bloom_filter: bool, bloom_capacity: int):
+        self.path = path
+        self.bucket_seconds = bucket_seconds
+        self.use_bloom_filter = use_bloom_filter
+        self.bloom_capacity = bloom_capacity
+        self._conn = LazyConnection(path, lambda conn: conn.executescript(self.SCHEMA))
+        self._lock = threading.Lock()
+        self._bloom: Optional[BloomFilter] = None
+        self._bloom_last_id = 0  # highest row id already added to the filter
+        self._data_version = -1
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        """Revoke a token until its expiry"""
+        if expires_at <= time.time():
+            return
+        bucket = int(expires_at // self.bucket_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO revoked_tokens (jti, bucket) VALUES (?, ?)", (jti, bucket)
+            )
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti: str) -> bool:
+        """Check whether a token ID has been revoked"""
+        with self._lock:
+            if self.use_bloom_filter:
+                self._sync_bloom()
+                if jti not in self._bloom:
+                    return False
+            return self._conn.execute(
+                "SELECT 1 FROM revoked_tokens WHERE jti = ?", (jti,)
+            ).fetchone() is not None
+
+    def _sync_bloom(self) -> None:
+        """Add revocations committed by other processes to the filter (caller holds the lock)"""
+        data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if self._bloom is not None and data_version == self._data_version:
+            return
+        self._data_version = data_version
+        
+        if self._bloom is None:
+            self._bloom = BloomFilter(self.bloom_capacity)
+            self._bloom_last_id = 0
+        for row in self._conn.execute(
+            "SELECT id, jti FROM revoked_tokens WHERE id > ? ORDER BY id", (self._bloom_last_id,)
+        ):
+            self._bloom.add(row["jti"])
+            self._bloom_last_id = row["id"]
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """Delete every bucket whose tokens have all expired, returning the number of jtis removed"""
+        now = time.time() if now is None else now
+        current_bucket = int(now // self.bucket_seconds)
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM revoked_tokens WHERE bucket < ?", (current_bucket,)
+            ).rowcount
+            
+            # Bloom filters can't delete, and other workers purge too, so rebuild from what's left
+            if self.use_bloom_filter:
+                self._bloom = None
+                self._sync_bloom()
+        return removed
+
+    async def purge_periodically(self) -> None:
+        """Purge expired buckets as each bucket window closes (run as a task from the lifespan)"""
+        while True:
+            await asyncio.to_thread(self.purge_expired)
+            next_bucket_at = (int(time.time() // self.bucket_seconds) + 1) * self.bucket_seconds
+            await asyncio.sleep(max(1.0, next_bucket_at - time.time()))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT bucket) FROM revoked_tokens"
+            ).fetchone()
+        return {
+            "revoked_tokens": row[0],
+            "buckets": row[1],
+            "bloom_filter": self.use_bloom_filter,
+        }
+
+
+revocation_store = RevocationStore(
+    settings.REVOCATION_DB_PATH,
+    settings.REVOCATION_BUCKET_SECONDS,
+    settings.REVOCATION_BLOOM_FILTER,
+    settings.REVOCATION_BLOOM_CAPACITY
+)
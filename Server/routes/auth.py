@@ -1,4 +1,5 @@
 from datetime import timedelta
+from typing import Optional
 from fastapi import APIRouter, HTTPException, status, Depends
 from fastapi.security import HTTPAuthorizationCredentials
 
@@ -10,19 +11,22 @@ from models import (
     RefreshTokenRequest,
     APIResponse
 )
+from metrics import TimedRoute
 from auth import (
     create_user, 
     authenticate_user, 
     create_access_token, 
     create_refresh_token,
     verify_token,
+    revoke_token,
     get_current_active_user,
+    token_cache,
     security,
     UserInDB
 )
 from config import settings
 
-router = APIRouter(prefix="/auth", tags=["Authentication"])
+router = APIRouter(prefix="/auth", tags=["Authentication"], route_class=TimedRoute)
 
 
 @router.post("/register", response_model=APIResponse, status_code=status.HTTP_201_CREATED)
@@ -37,7 +41,7 @@ async def register_user(user_data: UserCreate):
     """
     try:
         # Create new user
-        user = create_user(
+        user = await create_user(
             username=user_data.username,
             email=user_data.email,
             password=user_data.password,
@@ -81,7 +85,7 @@ async def login_user(user_credentials: UserLogin):
     Returns access token (30 min) and refresh token (7 days)
     """
     # Authenticate user
-    user = authenticate_user(user_credentials.username, user_credentials.password)
+    user = await authenticate_user(user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -188,15 +192,33 @@ async def get_current_user_info(current_user: UserInDB = Depends(get_current_act
 
 
 @router.post("/logout")
-async def logout_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def logout_user(
+    refresh_request: Optional[RefreshTokenRequest] = None,
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """
-    Logout user (token blacklisting would be implemented here in production)
+    Logout user by revoking their tokens
     
-    For now, this is a placeholder endpoint.
-    In production, you would add the token to a blacklist.
+    - **refresh_token**: Optional refresh token to revoke as well
+    
+    The access token from the Authorization header is revoked until it
+    expires, and so is the refresh token if one is given.
     """
-    # TODO: Implement token blacklisting
-    # For now, just return success message
+    # Revoke the access token
+    token_data = verify_token(credentials.credentials, "access")
+    revoke_token(token_data)
+    token_cache.invalidate(credentials.credentials)
+    
+    # Revoke the refresh token too, if it belongs to the same user
+    if refresh_request:
+        try:
+            refresh_data = verify_token(refresh_request.refresh_token, "refresh")
+        except HTTPException:
+            refresh_data = None
+        if refresh_data and refresh_data.user_id == token_data.user_id:
+            revoke_token(refresh_data)
+            token_cache.invalidate(refresh_request.refresh_token)
+    
     return APIResponse(
         success=True,
         message="Logged out successfully. Please remove the token from client storage."
@@ -1,11 +1,23 @@
-from typing import List, Optional
-from fastapi import APIRouter, HTTPException, status, Depends
+import asyncio
+import json
+import re
+import time
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
-from models import APIResponse, UserInDB
+from models import APIResponse, UserInDB, PDFMetadata, RetrievedChunk
+from metrics import TimedRoute
 from auth import get_current_active_user
+from file_utils import get_file_metadata
+from ingestion import search_file
+from chat_store import chat_history_store
+from llm import LLMError, llm_backend
+from answer_cache import answer_cache
 
-router = APIRouter(prefix="/chat", tags=["Chat"])
+router = APIRouter(prefix="/chat", tags=["Chat"], route_class=TimedRoute)
 
 
 # Chat models
@@ -18,6 +30,37 @@ class ChatResponse(BaseModel):
     message: str
     timestamp: str
     file_context: Optional[str] = None
+    sources: List[RetrievedChunk] = []
+
+
+def get_referenced_file(chat_message: ChatMessage, current_user: UserInDB) -> Optional[PDFMetadata]:
+    """Look up the referenced PDF, raising 404 if it is missing or not the user's"""
+    if not chat_message.file_id:
+        return None
+    
+    metadata = get_file_metadata(chat_message.file_id, current_user.id)
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
+        )
+    return metadata
+
+
+def record_exchange(current_user: UserInDB, chat_message: ChatMessage, reply: str) -> None:
+    """Append both sides of an exchange to the chat history (group-committed in the background)"""
+    chat_history_store.append(current_user.id, "user", chat_message.message, chat_message.file_id)
+    chat_history_store.append(current_user.id, "assistant", reply, chat_message.file_id)
+
+
+def replay_tokens(reply: str) -> List[str]:
+    """Split a cached reply into word tokens that join back to the same text"""
+    return re.findall(r"\S+\s*", reply)
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
 
 
 @router.post("/message", response_model=APIResponse)
@@ -31,29 +74,33 @@ async def send_chat_message(
     - **message**: The chat message
     - **file_id**: Optional ID of uploaded PDF for context
     
-    This is a dummy implementation. In production, this would:
-    1. Extract text from the referenced PDF
-    2. Send message + PDF context to AI model
-    3. Return AI response
+    The referenced PDF is chunked and indexed at upload time, so only the
+    top-k most relevant chunks are pulled in as context. The reply comes
+    from the configured LLM backend (`LLM_BACKEND`). Questions about a PDF
+    are answered from the answer cache when the same document was asked
+    the same question recently, skipping retrieval and the model.
     """
+    metadata = get_referenced_file(chat_message, current_user)
+    cache_document = metadata.content_hash if metadata and metadata.content_hash else None
+    cached = answer_cache.get(cache_document, chat_message.message) if cache_document else None
+    
     try:
-        # TODO: Implement actual chat functionality
-        # For now, return a dummy response
-        
-        response_message = f"I received your message: '{chat_message.message}'"
-        
-        if chat_message.file_id:
-            # TODO: Get PDF content and add to context
-            response_message += f" I also see you referenced file ID: {chat_message.file_id}. "
-            response_message += "In a real implementation, I would analyze the PDF content and provide insights."
+        if cached is not None:
+            response_message, sources = cached
         else:
-            response_message += " To get insights about a specific document, please upload a PDF first and reference its file_id in your message."
+            sources = await search_file(metadata, chat_message.message) if metadata else []
+            response_message = "".join([
+                token async for token in llm_backend.stream_reply(chat_message.message, metadata, sources)
+            ]).strip()
+            if cache_document and response_message:
+                answer_cache.put(cache_document, chat_message.message, response_message, sources)
+        record_exchange(current_user, chat_message, response_message)
         
-        from datetime import datetime
         chat_response = ChatResponse(
             message=response_message,
             timestamp=datetime.utcnow().isoformat(),
-            file_context=f"Referenced file: {chat_message.file_id}" if chat_message.file_id else None
+            file_context=f"Referenced file: {metadata.original_filename}" if metadata else None,
+            sources=sources
         )
         
         return APIResponse(
@@ -62,6 +109,11 @@ async def send_chat_message(
             data=chat_response.dict()
         )
         
+    except LLMError as e:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Chat processing failed: {str(e)}"
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -69,25 +121,128 @@ async def send_chat_message(
         )
 
 
+@router.post("/message/stream")
+async def stream_chat_message(
+    chat_message: ChatMessage,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Send a chat message and stream the reply as Server-Sent Events
+    
+    - **message**: The chat message
+    - **file_id**: Optional ID of uploaded PDF for context
+    
+    Emits a `token` event per generated token, then a `done` event carrying
+    `file_context`, `sources` and timing (including time-to-first-token).
+    Errors after the stream has started are sent as an `error` event.
+    Answers in the answer cache are replayed as tokens without retrieval or
+    a model call, and a completed reply is cached for the next asker.
+    """
+    started = time.perf_counter()
+    
+    # Resolve the file before streaming so a bad file_id is still a plain 404
+    metadata = get_referenced_file(chat_message, current_user)
+    cache_document = metadata.content_hash if metadata and metadata.content_hash else None
+    cached = answer_cache.get(cache_document, chat_message.message) if cache_document else None
+    if cached is not None:
+        cached_reply, sources = cached
+    else:
+        sources = await search_file(metadata, chat_message.message) if metadata else []
+    retrieval_ms = (time.perf_counter() - started) * 1000
+    
+    async def reply_tokens() -> AsyncIterator[str]:
+        if cached is not None:
+            for token in replay_tokens(cached_reply):
+                yield token
+            return
+        async for token in llm_backend.stream_reply(chat_message.message, metadata, sources):
+            yield token
+    
+    async def event_stream() -> AsyncIterator[str]:
+        first_token_ms = None
+        tokens: List[str] = []
+        try:
+            async for token in reply_tokens():
+                if first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - started) * 1000
+                tokens.append(token)
+                yield format_sse("token", {"token": token})
+        except Exception as e:
+            yield format_sse("error", {"error": f"Chat processing failed: {str(e)}"})
+            return
+        
+        response_message = "".join(tokens).strip()
+        # Only a reply that streamed to the end is cached
+        if cached is None and cache_document and response_message:
+            answer_cache.put(cache_document, chat_message.message, response_message, sources)
+        record_exchange(current_user, chat_message, response_message)
+        
+        yield format_sse("done", {
+            "timestamp": datetime.utcnow().isoformat(),
+            "file_context": f"Referenced file: {metadata.original_filename}" if metadata else None,
+            "sources": [source.dict() for source in sources],
+            "timing": {
+                "retrieval_ms": round(retrieval_ms, 2),
+                "first_token_ms": round(first_token_ms, 2) if first_token_ms is not None else None,
+                "total_ms": round((time.perf_counter() - started) * 1000, 2),
+            },
+        })
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies from buffering the stream
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 @router.get("/history")
 async def get_chat_history(
-    limit: int = 50,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    file_id: Optional[str] = None,
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
-    Get chat history for the current user
+    Get chat history for the current user, newest first
     
-    - **limit**: Maximum number of messages to return (default: 50)
+    - **limit**: Maximum number of messages to return (default: 50, max: 200)
+    - **cursor**: Opaque cursor from a previous page's `next_cursor`
+    - **file_id**: Optional ID of a PDF to only return messages about that document
     
-    This is a placeholder. In production, you would store and retrieve
-    actual chat history from a database.
+    Pages are keyset-paginated over a (user_id, created_at) index, so any
+    page costs an index seek regardless of how long the history is.
     """
-    # TODO: Implement actual chat history storage and retrieval
+    def load_page():
+        # Make sure this user's latest messages are committed before reading
+        chat_history_store.flush()
+        return chat_history_store.get_page(current_user.id, limit, cursor, file_id)
+    
+    try:
+        messages, next_cursor = await asyncio.to_thread(load_page)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
     return APIResponse(
         success=True,
         message="Chat history retrieved",
         data={
-            "messages": [],
-            "note": "Chat history feature not yet implemented. Messages are not persisted."
+            "messages": [
+                {
+                    "id": message["id"],
+                    "role": message["role"],
+                    "content": message["content"],
+                    "file_id": message["file_id"],
+                    "created_at": datetime.utcfromtimestamp(message["created_at"]).isoformat()
+                }
+                for message in messages
+            ],
+            "next_cursor": next_cursor
         }
     )
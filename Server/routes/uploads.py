@@ -1,23 +1,64 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File
-from fastapi.responses import FileResponse
+import asyncio
+from datetime import datetime
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, status, Depends, UploadFile, File, Query, Request, Header, Response
+from fastapi.responses import JSONResponse
 
 from models import (
     PDFUploadResponse, 
     PDFListResponse, 
     APIResponse,
-    UserInDB
+    UserInDB,
+    ResumableUploadCreate,
+    ResumableUploadStatus,
+    BatchUploadResult,
+    BatchUploadResponse,
+    PageText,
+    PageRangeResponse,
+    IngestionStatus
 )
-from auth import get_current_active_user
+from metrics import TimedRoute
+from auth import get_current_active_user, get_current_admin_user
+from config import settings
+from range_response import file_response
+from metadata_store import decode_file_cursor, encode_file_cursor
+from ingestion import load_pages
+from ingestion_queue import ingestion_queue
 from file_utils import (
     save_uploaded_file,
+    save_uploaded_files,
     get_user_files,
+    get_user_file_totals,
+    get_recent_user_files,
     get_file_metadata,
     delete_file,
-    get_file_stats
+    get_file_stats,
+    rebuild_file_stats
 )
+from resumable import (
+    create_upload,
+    get_upload_status,
+    write_chunk,
+    finalize_upload,
+    cancel_upload
+)
+
+router = APIRouter(prefix="/uploads", tags=["File Uploads"], route_class=TimedRoute)
+
+
+async def ensure_ingestion_capacity(incoming: int = 1) -> None:
+    """Reject new uploads while the ingestion queue is full, instead of piling up work"""
+    # The queue is shared with other workers through SQLite, so don't wait on it in the event loop
+    if await asyncio.to_thread(ingestion_queue.is_saturated, incoming):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many documents are waiting to be processed. Please retry later",
+            headers={"Retry-After": str(settings.INGESTION_RETRY_AFTER_SECONDS)}
+        )
 
-router = APIRouter(prefix="/uploads", tags=["File Uploads"])
+
+# Fields a listing can project to, in response order
+LIST_FIELDS = tuple(PDFUploadResponse.model_fields)
 
 
 @router.post("/pdf", response_model=PDFUploadResponse, status_code=status.HTTP_201_CREATED)
@@ -31,7 +72,12 @@ async def upload_pdf(
     - **file**: PDF file (max 10MB)
     
     Requires authentication. Returns file metadata including file_id for future reference.
+    Text extraction and indexing run in the background; poll
+    `/uploads/pdf/{file_id}/status` to see when the file is ready for chat.
+    Returns 503 with `Retry-After` while the ingestion queue is full.
     """
+    await ensure_ingestion_capacity()
+    
     try:
         # Save file and get metadata
         metadata = await save_uploaded_file(file, current_user.id)
@@ -56,35 +102,123 @@ async def upload_pdf(
         )
 
 
-@router.get("/pdfs", response_model=PDFListResponse)
-async def list_user_pdfs(current_user: UserInDB = Depends(get_current_active_user)):
+@router.post("/pdfs/batch", response_model=BatchUploadResponse)
+async def upload_pdfs(
+    files: List[UploadFile] = File(..., description="PDF files to upload"),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
     """
-    Get list of uploaded PDFs for the current user
+    Upload several PDF files in one request
+    
+    - **files**: PDF files (max 10MB each, up to MAX_BATCH_FILES per request)
     
-    Requires authentication. Returns all PDFs uploaded by the current user.
+    Files are written concurrently and their metadata is stored in a single
+    transaction. Each file gets its own result, so one bad file does not fail
+    the batch. Each stored file gets its own ingestion job, queued together.
     """
+    if len(files) > settings.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many files. Maximum per batch: {settings.MAX_BATCH_FILES}"
+        )
+    await ensure_ingestion_capacity(len(files))
+    
     try:
-        # Get user's files
-        user_files = get_user_files(current_user.id)
+        outcomes = await save_uploaded_files(files, current_user.id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Upload failed: {str(e)}"
+        )
+    
+    results = []
+    stored = []
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, HTTPException):
+            results.append(BatchUploadResult(filename=file.filename, success=False, error=outcome.detail))
+            continue
         
-        # Convert to response format
-        pdf_responses = [
-            PDFUploadResponse(
-                file_id=metadata.file_id,
-                filename=metadata.filename,
-                original_filename=metadata.original_filename,
-                file_size=metadata.file_size,
-                content_type=metadata.content_type,
-                upload_time=metadata.upload_time,
-                user_id=metadata.user_id
+        stored.append(outcome)
+        results.append(BatchUploadResult(
+            filename=file.filename,
+            success=True,
+            file=PDFUploadResponse(
+                file_id=outcome.file_id,
+                filename=outcome.filename,
+                original_filename=outcome.original_filename,
+                file_size=outcome.file_size,
+                content_type=outcome.content_type,
+                upload_time=outcome.upload_time,
+                user_id=outcome.user_id
             )
-            for metadata in user_files
-        ]
-        
-        return PDFListResponse(
-            files=pdf_responses,
-            total_count=len(pdf_responses)
+        ))
+    
+    return BatchUploadResponse(
+        results=results,
+        succeeded=len(stored),
+        failed=len(results) - len(stored)
+    )
+
+
+@router.get("/pdfs", response_model=PDFListResponse)
+async def list_user_pdfs(
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated file fields to return"),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Get list of uploaded PDFs for the current user, newest first
+    
+    - **limit**: Maximum number of files to return (default: 50, max: 1000)
+    - **cursor**: Opaque cursor from a previous page's `next_cursor`
+    - **fields**: Optional comma-separated subset of file fields, e.g. `file_id,original_filename`
+    
+    Pages are keyset-paginated over a (user_id, upload_time, file_id) index, so
+    any page costs an index seek regardless of how many files the user has.
+    `total_count` is the number of files the user has in total, not the
+    number on this page; page through with `next_cursor` until it is null.
+    """
+    if fields:
+        selected = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [field for field in selected if field not in LIST_FIELDS]
+        if unknown or not selected:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(LIST_FIELDS)}"
+            )
+    else:
+        selected = list(LIST_FIELDS)
+    
+    try:
+        after = decode_file_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
         )
+    
+    try:
+        # Fetch one extra row to know whether there is another page
+        user_files = get_user_files(current_user.id, limit + 1, after)
+        total_count, _ = get_user_file_totals(current_user.id)
+        
+        next_cursor = encode_file_cursor(user_files[limit - 1]) if len(user_files) > limit else None
+        
+        # The store already built these models, so serialize the selected fields
+        # directly instead of re-validating them through PDFListResponse
+        files = []
+        for metadata in user_files[:limit]:
+            item = {field: getattr(metadata, field) for field in selected}
+            if "upload_time" in item:
+                item["upload_time"] = item["upload_time"].isoformat()
+            files.append(item)
+        
+        return JSONResponse({
+            "files": files,
+            "total_count": total_count,
+            "next_cursor": next_cursor
+        })
         
     except Exception as e:
         raise HTTPException(
@@ -125,9 +259,143 @@ async def get_pdf_metadata(
     )
 
 
+def to_ingestion_status(job: dict) -> IngestionStatus:
+    return IngestionStatus(
+        file_id=job["file_id"],
+        status=job["status"],
+        progress=job["progress"],
+        error=job["error"],
+        queue_position=job["queue_position"],
+        updated_at=datetime.utcfromtimestamp(job["updated_at"])
+    )
+
+
+@router.get("/pdf/{file_id}/status", response_model=IngestionStatus)
+async def get_pdf_status(
+    file_id: str,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Get the ingestion status of an uploaded PDF
+    
+    - **file_id**: ID of the PDF file
+    
+    `status` is one of queued, processing, ready or failed. `progress` goes
+    from 0 to 1, and `queue_position` is set while the job is queued. Files
+    without a job (uploaded before the queue existed) get 404; POST to
+    `/uploads/pdf/{file_id}/ingest` to queue them.
+    """
+    metadata = get_file_metadata(file_id, current_user.id)
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
+        )
+    
+    job = await asyncio.to_thread(ingestion_queue.get_status, file_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="This file has no ingestion job. POST to its /ingest endpoint to queue one"
+        )
+    
+    return to_ingestion_status(job)
+
+
+@router.post("/pdf/{file_id}/ingest", response_model=IngestionStatus, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_pdf(
+    file_id: str,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Queue a PDF for ingestion
+    
+    - **file_id**: ID of the PDF file
+    
+    For files without a job or whose job failed. A file that is already
+    queued or processing keeps its job. Returns the job's status, or 503 with
+    `Retry-After` while the ingestion queue is full.
+    """
+    metadata = get_file_metadata(file_id, current_user.id)
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
+        )
+    
+    await ensure_ingestion_capacity()
+    await asyncio.to_thread(ingestion_queue.enqueue, [file_id])
+    
+    return to_ingestion_status(await asyncio.to_thread(ingestion_queue.get_status, file_id))
+
+
+@router.get("/pdf/{file_id}/pages", response_model=PageRangeResponse)
+async def get_pdf_pages(
+    file_id: str,
+    start: int = Query(1, ge=1),
+    end: Optional[int] = Query(None, ge=1),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Get the extracted text of a range of pages
+    
+    - **file_id**: ID of the PDF file
+    - **start**: First page, 1-based (default: 1)
+    - **end**: Last page, inclusive (default: same as start)
+    
+    Pages are sliced out of the memory-mapped extracted text, so only the
+    requested pages are read. If the document has not been extracted yet, only
+    the requested pages are parsed and full extraction is queued.
+    """
+    end = end if end is not None else start
+    if end < start:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end must not be before start"
+        )
+    if end - start + 1 > settings.MAX_PAGES_PER_REQUEST:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Too many pages. Maximum per request: {settings.MAX_PAGES_PER_REQUEST}"
+        )
+    
+    metadata = get_file_metadata(file_id, current_user.id)
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found or you don't have permission to access it"
+        )
+    
+    try:
+        page_count, pages, cached = await load_pages(metadata, start - 1, end)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Failed to extract text: {str(e)}"
+        )
+    
+    if not cached:
+        await asyncio.to_thread(ingestion_queue.enqueue, [metadata.file_id])
+    
+    if start > page_count:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Page range out of bounds. Document has {page_count} page(s)"
+        )
+    
+    return PageRangeResponse(
+        file_id=metadata.file_id,
+        page_count=page_count,
+        start=start,
+        end=start + len(pages) - 1,
+        pages=[PageText(page=start + i, text=text) for i, text in enumerate(pages)]
+    )
+
+
 @router.get("/pdf/{file_id}/download")
 async def download_pdf(
     file_id: str,
+    request: Request,
     current_user: UserInDB = Depends(get_current_active_user)
 ):
     """
@@ -136,6 +404,8 @@ async def download_pdf(
     - **file_id**: ID of the PDF file
     
     Requires authentication. Only allows downloading files owned by the current user.
+    Supports conditional requests (`If-None-Match`, `If-Modified-Since` -> 304)
+    and byte ranges (`Range`, including multiple ranges -> 206).
     """
     # Get file metadata
     metadata = get_file_metadata(file_id, current_user.id)
@@ -154,9 +424,13 @@ async def download_pdf(
             detail="File not found on server"
         )
     
-    # Return file
-    return FileResponse(
+    # Return file; the content hash is a strong validator since blobs never change
+    return file_response(
+        request,
         path=metadata.file_path,
+        file_size=metadata.file_size,
+        etag=f'"{metadata.content_hash or metadata.file_id}"',
+        last_modified=metadata.upload_time,
         filename=metadata.original_filename,
         media_type=metadata.content_type
     )
@@ -175,7 +449,7 @@ async def delete_pdf(
     Requires authentication. Only allows deleting files owned by the current user.
     """
     # Delete file
-    success = delete_file(file_id, current_user.id)
+    success = await delete_file(file_id, current_user.id)
     
     if not success:
         raise HTTPException(
@@ -195,17 +469,14 @@ async def get_upload_stats(current_user: UserInDB = Depends(get_current_active_u
     Get file upload statistics for the current user
     
     Requires authentication. Returns statistics about the user's uploaded files.
+    Counts and sizes are maintained on upload and delete, so this is O(1).
     """
     try:
-        # Get user's files
-        user_files = get_user_files(current_user.id)
-        
-        # Calculate statistics
-        total_files = len(user_files)
-        total_size = sum(metadata.file_size for metadata in user_files)
+        # Maintained counters
+        total_files, total_size = get_user_file_totals(current_user.id)
         
         # Get recent files (last 5)
-        recent_files = user_files[:5]
+        recent_files = get_recent_user_files(current_user.id)
         
         return {
             "total_files": total_files,
@@ -227,3 +498,136 @@ async def get_upload_stats(current_user: UserInDB = Depends(get_current_active_u
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get statistics: {str(e)}"
         )
+
+
+@router.post("/stats/rebuild", response_model=APIResponse)
+async def rebuild_upload_stats(current_user: UserInDB = Depends(get_current_admin_user)):
+    """
+    Rebuild the maintained upload counters from stored file metadata
+    
+    Requires the admin role. Reports how many counters had drifted.
+    """
+    drifted = await asyncio.to_thread(rebuild_file_stats)
+    totals = get_file_stats()
+    
+    return APIResponse(
+        success=True,
+        message="Upload statistics rebuilt",
+        data={"drifted_counters": drifted, **totals}
+    )
+
+
+@router.post("/resumable", response_model=ResumableUploadStatus, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    upload: ResumableUploadCreate,
+    response: Response,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Start a resumable upload
+    
+    - **filename**: Original filename
+    - **file_size**: Total size in bytes (max 500MB)
+    - **content_type**: Must be application/pdf
+    
+    Requires authentication. Send the bytes with PATCH requests, then finalize.
+    Returns 503 with `Retry-After` while the ingestion queue is full, and 429
+    or 413 when the user already has too many unfinished uploads or bytes
+    reserved.
+    """
+    await ensure_ingestion_capacity()
+    
+    upload_status = await create_upload(current_user.id, upload.filename, upload.file_size, upload.content_type)
+    response.headers["Location"] = f"{settings.API_V1_PREFIX}{router.prefix}/resumable/{upload_status.upload_id}"
+    response.headers["Upload-Offset"] = str(upload_status.offset)
+    return upload_status
+
+
+@router.get("/resumable/{upload_id}", response_model=ResumableUploadStatus)
+async def get_resumable_upload(
+    upload_id: str,
+    response: Response,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Get the progress of a resumable upload
+    
+    - **upload_id**: ID returned when the upload was created
+    
+    Requires authentication. `offset` is where the next PATCH must start.
+    """
+    upload_status = get_upload_status(upload_id, current_user.id)
+    response.headers["Upload-Offset"] = str(upload_status.offset)
+    return upload_status
+
+
+@router.patch("/resumable/{upload_id}", response_model=ResumableUploadStatus)
+async def patch_resumable_upload(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Append a chunk to a resumable upload
+    
+    - **upload_id**: ID returned when the upload was created
+    - **Upload-Offset** header: Byte offset of this chunk; must equal the current offset
+    
+    Requires authentication. The raw request body is written straight into
+    the preallocated file at the offset, without multipart parsing.
+    """
+    upload_status = await write_chunk(upload_id, current_user.id, upload_offset, request.stream())
+    response.headers["Upload-Offset"] = str(upload_status.offset)
+    return upload_status
+
+
+@router.post("/resumable/{upload_id}/finalize", response_model=PDFUploadResponse, status_code=status.HTTP_201_CREATED)
+async def finalize_resumable_upload(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Finish a resumable upload
+    
+    - **upload_id**: ID returned when the upload was created
+    
+    Requires authentication. All bytes must have been received. Returns file
+    metadata including file_id, exactly like a single-request upload. While the
+    ingestion queue is full this returns 503 with `Retry-After`; the received
+    bytes are kept, so retry the finalize.
+    """
+    await ensure_ingestion_capacity()
+    
+    metadata = await finalize_upload(upload_id, current_user.id)
+    
+    return PDFUploadResponse(
+        file_id=metadata.file_id,
+        filename=metadata.filename,
+        original_filename=metadata.original_filename,
+        file_size=metadata.file_size,
+        content_type=metadata.content_type,
+        upload_time=metadata.upload_time,
+        user_id=metadata.user_id
+    )
+
+
+@router.delete("/resumable/{upload_id}", response_model=APIResponse)
+async def cancel_resumable_upload(
+    upload_id: str,
+    current_user: UserInDB = Depends(get_current_active_user)
+):
+    """
+    Cancel a resumable upload
+    
+    - **upload_id**: ID returned when the upload was created
+    
+    Requires authentication. Deletes any bytes received so far.
+    """
+    cancel_upload(upload_id, current_user.id)
+    
+    return APIResponse(
+        success=True,
+        message="Upload cancelled"
+    )
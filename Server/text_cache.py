@@ -0,0 +1,240 @@
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+# Disk entries are one file: this header, the page-offset table, then the packed text.
+# Keeping both in one file means a single rename publishes them together
+PACK_MAGIC = b"PDFTXT01"
+PACK_HEADER = struct.Struct("<8sQ")  # magic, page count
+
+
+class ExtractedText:
+    """Extracted text of a document, packed as UTF-8 with a page-offset table"""
+
+    __slots__ = ("data", "page_offsets")
+
+    def __init__(self, data, page_offsets: array):
+        # bytes, or an mmap of the packed text file
+        self.data = data
+        # page_offsets[i] is the byte offset where page i starts; the last entry is len(data)
+        self.page_offsets = page_offsets
+
+    @classmethod
+    def from_pages(cls, pages: List[str]) -> "ExtractedText":
+        """Pack a list of page strings"""
+        encoded = [page.encode("utf-8") for page in pages]
+        offsets = array("q", [0])
+        for chunk in encoded:
+            offsets.append(offsets[-1] + len(chunk))
+        return cls(b"".join(encoded), offsets)
+
+    @property
+    def page_count(self) -> int:
+        return len(self.page_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.data) + self.page_offsets.itemsize * len(self.page_offsets)
+
+    def page(self, index: int) -> str:
+        """Get the text of a single page"""
+        # Decode straight from the buffer without copying the slice first
+        return str(memoryview(self.data)[self.page_offsets[index]:self.page_offsets[index + 1]], "utf-8")
+
+    def page_range(self, start: int, end: int) -> List[str]:
+        """Get the text of pages start..end (0-based, exclusive end)"""
+        return [self.page(i) for i in range(start, min(end, self.page_count))]
+
+    @property
+    def pages(self) -> List[str]:
+        return [self.page(i) for i in range(self.page_count)]
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8")
+
+
+class TextCache:
+    """Two-tier cache for extracted text keyed by content hash
+
+    Entries are written through to disk and kept in an in-memory LRU that is
+    capped in bytes. Memory evictions only drop the in-memory copy, so an
+    evicted entry is reloaded from disk instead of re-parsing the PDF.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, ExtractedText]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pack")
+
+    def _legacy_paths(self, key: str):
+        # Text and offsets used to be written to two files, published one after the other
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.txt", f"{base}.idx"
+
+    @staticmethod
+    def _read_header(f, file_size: int) -> Optional[Tuple[array, int]]:
+        """Read the offset table of a packed entry, returning it with where the text starts
+
+        Returns None if the file is not a complete entry.
+        """
+        header = f.read(PACK_HEADER.size)
+        if len(header) < PACK_HEADER.size:
+            return None
+        magic, page_count = PACK_HEADER.unpack(header)
+        if magic != PACK_MAGIC:
+            return None
+        
+        offsets = array("q")
+        data_start = PACK_HEADER.size + (page_count + 1) * offsets.itemsize
+        if data_start > file_size:
+            return None
+        offsets.frombytes(f.read(data_start - PACK_HEADER.size))
+        # A rename publishes the whole file at once, so only a foreign or damaged file fails this
+        if offsets[-1] != file_size - data_start:
+            return None
+        return offsets, data_start
+
+    def _remember(self, key: str, entry: ExtractedText) -> None:
+        """Insert into the memory tier and evict least recently used entries (lock held)"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._size -= old.nbytes
+        
+        # Entries larger than the whole budget are only kept on disk
+        if entry.nbytes > self.max_bytes:
+            return
+        
+        self._entries[key] = entry
+        self._size += entry.nbytes
+        while self._size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.nbytes
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[ExtractedText]:
+        """Get an entry from memory, falling back to the disk tier"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key: str, entry: ExtractedText) -> None:
+        """Store an entry in both tiers"""
+        self._store(key, entry)
+        with self._lock:
+            self._remember(key, entry)
+
+    def get_pages(self, key: str, start: int, end: int) -> Optional[Tuple[int, List[str]]]:
+        """Get (page count, pages start..end) without loading the whole document
+
+        Served from memory if the entry is there, otherwise sliced out of a
+        memory-mapped text file; only the requested pages are read and decoded.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.page_count, entry.page_range(start, end)
+        
+        page_count = None
+        try:
+            with open(self._path(key), "rb") as f:
+                file_size = os.fstat(f.fileno()).st_size
+                table = self._read_header(f, file_size)
+                if table is not None:
+                    offsets, data_start = table
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        # The view must be released before the map can close
+                        with memoryview(data)[data_start:] as text:
+                            mapped = ExtractedText(text, offsets)
+                            page_count, pages = mapped.page_count, mapped.page_range(start, end)
+        except FileNotFoundError:
+            pass
+        
+        if page_count is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        with self._lock:
+            self.disk_hits += 1
+        return page_count, pages
+
+    def invalidate(self, key: str) -> None:
+        """Remove an entry from both tiers"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old.nbytes
+        
+        for path in (self._path(key), *self._legacy_paths(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _load(self, key: str) -> Optional[ExtractedText]:
+        try:
+            with open(self._path(key), "rb") as f:
+                table = self._read_header(f, os.fstat(f.fileno()).st_size)
+                if table is None:
+                    return None
+                offsets, _ = table
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return ExtractedText(data, offsets)
+
+    def _store(self, key: str, entry: ExtractedText) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial entry;
+        # the pid keeps server processes storing the same entry from sharing a temp file
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(PACK_HEADER.pack(PACK_MAGIC, entry.page_count))
+            f.write(entry.page_offsets.tobytes())
+            f.write(entry.data)
+        os.replace(tmp_path, path)
+
+    def stats(self) -> Dict[str, int]:
+        """Get hit/miss/eviction counters for capacity planning"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "memory_bytes": self._size,
+                "max_memory_bytes": self.max_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+text_cache = TextCache(settings.TEXT_CACHE_DIR, settings.TEXT_CACHE_MAX_BYTES)
@@ -0,0 +1,77 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from config import settings
+from models import TokenData
+
+
+class TokenCache:
+    """Bounded LRU of decoded JWT claims keyed by token digest
+
+    Entries expire at the token's own `exp`, so a cached token is never
+    accepted after the JWT itself would have been rejected.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[TokenData, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str, token_type: str) -> Tuple[str, str]:
+        return token_type, hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str, token_type: str) -> Optional[TokenData]:
+        """Get cached claims for a token, or None if absent or expired"""
+        key = self._key(token, token_type)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            token_data, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return token_data
+
+    def put(self, token: str, token_type: str, token_data: TokenData, expires_at: float) -> None:
+        """Cache decoded claims until the token's expiry"""
+        key = self._key(token, token_type)
+        with self._lock:
+            self._entries[key] = (token_data, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        """Drop a token from the cache (e.g. on logout)"""
+        with self._lock:
+            for token_type in ("access", "refresh"):
+                self._entries.pop(self._key(token, token_type), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
@@ -0,0 +1,103 @@
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Optional
+
+from config import settings
+from db import LazyConnection
+from models import UserInDB, UserRole
+
+
+class UserExistsError(Exception):
+    """Raised when a username or email is already registered"""
+
+
+class UserStore:
+    """User accounts in SQLite, shared by every server process
+
+    Usernames and emails are unique in the table itself, so two workers
+    registering the same name at once cannot both succeed.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        id TEXT PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE,
+        email TEXT NOT NULL UNIQUE,
+        full_name TEXT,
+        hashed_password TEXT NOT NULL,
+        role TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        is_active INTEGER NOT NULL
+    );
+    """
+
+    COLUMNS = "id, username, email, full_name, hashed_password, role, created_at, is_active"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = LazyConnection(path, lambda conn: conn.executescript(self.SCHEMA))
+        # One connection shared by the event loop and worker threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _to_row(user: UserInDB) -> tuple:
+        return (
+            user.id,
+            user.username,
+            user.email,
+            user.full_name,
+            user.hashed_password,
+            user.role.value,
+            user.created_at.isoformat(timespec="microseconds"),
+            int(user.is_active),
+        )
+
+    @staticmethod
+    def _from_row(row) -> UserInDB:
+        # Rows were validated on the way in, so skip validating them again
+        return UserInDB.model_construct(
+            id=row["id"],
+            username=row["username"],
+            email=row["email"],
+            full_name=row["full_name"],
+            hashed_password=row["hashed_password"],
+            role=UserRole(row["role"]),
+            created_at=datetime.fromisoformat(row["created_at"]),
+            is_active=bool(row["is_active"])
+        )
+
+    def add(self, user: UserInDB) -> None:
+        """Store a new user, raising UserExistsError if the username or email is taken"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    f"INSERT INTO users ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._to_row(user)
+                )
+        except sqlite3.IntegrityError as e:
+            raise UserExistsError(str(e)) from e
+
+    def add_missing(self, users: List[UserInDB]) -> None:
+        """Store users that aren't registered yet; safe to run from every worker at startup"""
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR IGNORE INTO users ({self.COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._to_row(user) for user in users]
+            )
+
+    def get_by_username(self, username: str) -> Optional[UserInDB]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM users WHERE username = ?", (username,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def get_by_email(self, email: str) -> Optional[UserInDB]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {self.COLUMNS} FROM users WHERE email = ?", (email,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+
+user_store = UserStore(settings.USERS_DB_PATH)
@@ -0,0 +1,132 @@
+import os
+import zlib
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from config import settings
+from retrieval import document_chunks, tokenize
+from text_cache import ExtractedText
+
+# Rows scored per step; each step converts one block of int8 rows to float32, so a
+# query needs a fixed ~SEARCH_BLOCK_ROWS * EMBEDDING_DIM * 4 bytes however large the index
+SEARCH_BLOCK_ROWS = 4096
+
+
+@lru_cache(maxsize=65536)
+def _token_features(token: str) -> Tuple[int, ...]:
+    """Stable 32-bit hashes of a word and its character trigrams"""
+    hashes = [zlib.crc32(token.encode("utf-8"))]
+    padded = f"#{token}#"
+    for i in range(len(padded) - 2):
+        hashes.append(zlib.crc32(padded[i:i + 3].encode("utf-8")) ^ 0x5BD1E995)
+    return tuple(hashes)
+
+
+def _hashed_features(text: str) -> List[int]:
+    """Feature hashes of every token in a text"""
+    hashes: List[int] = []
+    for token in tokenize(text):
+        hashes.extend(_token_features(token))
+    return hashes
+
+
+def embed_texts(texts: List[str], dim: int = settings.EMBEDDING_DIM) -> np.ndarray:
+    """Embed texts as L2-normalised hashed n-gram projections (float32, one row per text)"""
+    vectors = np.zeros((len(texts), dim), dtype=np.float32)
+    batch_size = settings.EMBEDDING_BATCH_SIZE
+    for batch_start in range(0, len(texts), batch_size):
+        rows: List[int] = []
+        hashes: List[int] = []
+        for offset, text in enumerate(texts[batch_start:batch_start + batch_size]):
+            features = _hashed_features(text)
+            rows.extend([offset] * len(features))
+            hashes.extend(features)
+        if not hashes:
+            continue
+        
+        # Scatter the whole batch at once: low bits pick the column, the top bit the sign
+        hash_array = np.asarray(hashes, dtype=np.uint32)
+        signs = np.where(hash_array & 0x80000000, 1.0, -1.0)
+        cells = np.asarray(rows, dtype=np.int64) * dim + hash_array % dim
+        batch_rows = min(batch_size, len(texts) - batch_start)
+        counts = np.bincount(cells, weights=signs, minlength=batch_rows * dim)
+        vectors[batch_start:batch_start + batch_rows] = counts.reshape(batch_rows, dim)
+    
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Quantize rows to int8 with a per-row float32 scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def _paths(key: str) -> Tuple[str, str]:
+    base = os.path.join(settings.VECTOR_INDEX_DIR, key)
+    return f"{base}.vec.npy", f"{base}.scale.npy"
+
+
+def build_vector_index(key: str, chunks: List[str]) -> None:
+    """Embed, quantize and write a document's chunk vectors (runs inside a worker process)"""
+    quantized, scales = quantize(embed_texts(chunks))
+    os.makedirs(settings.VECTOR_INDEX_DIR, exist_ok=True)
+    for path, array in zip(_paths(key), (quantized, scales)):
+        tmp_path = f"{path}.{os.getpid()}.tmp.npy"
+        np.save(tmp_path, array)
+        os.replace(tmp_path, path)
+
+
+def build_document_vectors(key: str, extracted: ExtractedText) -> None:
+    """Chunk a document and build its vector index (runs inside a worker process)"""
+    build_vector_index(key, document_chunks(extracted))
+
+
+class VectorIndex:
+    """Memory-mapped int8 chunk vectors of one document"""
+
+    def __init__(self, vectors: np.ndarray, scales: np.ndarray):
+        self.vectors = vectors
+        self.scales = scales
+
+    @classmethod
+    def load(cls, key: str) -> Optional["VectorIndex"]:
+        vector_path, scale_path = _paths(key)
+        if not (os.path.exists(vector_path) and os.path.exists(scale_path)):
+            return None
+        # Pages are only faulted in when searched, so resident memory stays flat
+        return cls(np.load(vector_path, mmap_mode="r"), np.load(scale_path, mmap_mode="r"))
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the mapped arrays (resident once fully searched)"""
+        return self.vectors.nbytes + self.scales.nbytes
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Get the top-k (chunk_id, cosine score) pairs for a query"""
+        num_chunks = self.vectors.shape[0]
+        if num_chunks == 0:
+            return []
+        
+        query_vector = embed_texts([query])[0]
+        scores = np.empty(num_chunks, dtype=np.float32)
+        for start in range(0, num_chunks, SEARCH_BLOCK_ROWS):
+            block = self.vectors[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query_vector
+        scores *= self.scales
+        top_k = min(top_k, num_chunks)
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(chunk_id), float(scores[chunk_id])) for chunk_id in top if scores[chunk_id] > 0]
+
+
+def remove_vector_index(key: str) -> None:
+    """Delete a document's vector files"""
+    for path in _paths(key):
+        if os.path.exists(path):
+            os.remove(path)